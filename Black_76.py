@@ -0,0 +1,40 @@
+import numpy as np
+from scipy.stats import norm
+
+#----------------------------------------------------------------------------
+'''
+Function converts option type ('calls' / 'puts', scalar or array) to the sign eps = +1 for calls and eps = -1 for puts.
+Numeric input is treated as already computed sign.
+'''
+def get_option_sign(optionType):
+    optionType = np.asarray(optionType)
+    if optionType.dtype.kind in 'fiu':
+        return optionType.astype(float)
+    return np.where(optionType == 'calls', 1.0, -1.0)
+
+#----------------------------------------------------------------------------
+'''
+Function computes undiscounted Black-76 option value and Greeks for arrays of forwards, strikes, year fractions, volatilities and option types.
+d1, d2 and normal pdf/cdf are computed only once and shared between all outputs. Greeks are taken with respect to the forward F and volatility sigma.
+Function returns dictionary with arrays: price, delta, vega, gamma, vanna, volga.
+'''
+def black_76(F, K, T, sigma, optionType):
+    F, K, T, sigma = np.broadcast_arrays(np.asarray(F, dtype=float), np.asarray(K, dtype=float), np.asarray(T, dtype=float), np.asarray(sigma, dtype=float))
+    eps = np.broadcast_to(get_option_sign(optionType), F.shape)
+    sqrt_T = np.sqrt(T)
+    stddev = sigma*sqrt_T
+    d1 = np.log(F/K)/stddev + 0.5*stddev
+    d2 = d1 - stddev
+    cdf_d1 = norm.cdf(eps*d1)
+    cdf_d2 = norm.cdf(eps*d2)
+    pdf_d1 = norm.pdf(d1)
+    
+    vega = F * pdf_d1 * sqrt_T
+    return {
+        "price": eps *(F * cdf_d1 - K * cdf_d2),
+        "delta": eps * cdf_d1,
+        "vega": vega,
+        "gamma": pdf_d1 / (F * stddev),
+        "vanna": -pdf_d1 * d2 / sigma,
+        "volga": vega * d1 * d2 / sigma,
+    }
@@ -1,7 +1,12 @@
 import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
-from scipy.stats import norm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from Black_76 import black_76, get_option_sign
+from Vol_surface import VolSurface
+from Market_curves import DiscountCurve
+from Snapshot_catalog import parse_snapshot_time
+import os
 
 import warnings
 warnings.filterwarnings('ignore')
@@ -10,60 +15,85 @@ warnings.filterwarnings('ignore')
 ''' 
 Function computes implied volatility by inverse solving Black-76 model respect to sigma, for given market option data.   
 Options data has to contain information about strikes; expiry dates; bid,ask,mid prices; reference spot; last trade date; dividend yeild.
+Expiry dates are independent, so they can be processed concurrently: executor='process' or 'thread' with max_workers workers,
+the surface is reassembled in the order of expiry dates, so result does not depend on executor.
+data is the time of the snapshot (datetime, e.g. from SnapshotCatalog) or name of its file ("%Y-%m-%d-%H-%M.csv" or "%Y-%m-%d-%H-%M-%S.csv" of sub-minute snapshots).
+Discount factors come from discount_curve (dataframe with SOFR forward curve from DATA/discount_curve.csv or DiscountCurve object, None means DF = 1),
+with implied_discount_factor=True they are replaced by market implied ones where call - put parity regression is possible.
+With vol_surface=True the result is columnar VolSurface object (dictionary-compatible) instead of dictionary of lists.
 Function returns dictionary with computed implied volatility.
 
 '''
-def get_Implied_volatility(options_data, discount_curve, data, expiry_date_list=None, bid_ask=True):
-    data_date = datetime.strptime(data.replace('.csv', ''), "%Y-%m-%d-%H-%M")
+def get_Implied_volatility(options_data, discount_curve, data, expiry_date_list=None, bid_ask=True, executor=None, max_workers=None, vol_surface=False, implied_discount_factor=True):
+    data_date = data if isinstance(data, datetime) else parse_snapshot_time(os.path.splitext(os.path.basename(data))[0])
+    if data_date is None:
+        raise ValueError("Snapshot time can not be parsed from file name: " + str(data))
     
     Implied_Volatility={}
     Implied_Volatility["underlying_ticker"]= options_data["ticker"].iloc[0]
     Implied_Volatility["data_date"] = data_date
-    Implied_Volatility["reference_spot"] = reference_spot = float(options_data["last close"].iloc[0])
-    Implied_Volatility_surface =list()
+    Implied_Volatility["reference_spot"] = float(options_data["last close"].iloc[0])
     
     if not expiry_date_list:
         expiry_date_list=options_data["expiryDate"].unique().tolist()
     
-    # for each expiry date compute implied volatility
-    for expiry_date in expiry_date_list:
-        if data_date <= datetime.strptime(expiry_date, "%Y-%m-%d"):
-            options_data_expiry_date = options_data.loc[options_data["expiryDate"]==expiry_date] #take only necessary options for given expiry date
-            # compute discount factor for reference forward
-#             SOFR_discount_rate_dayfraction = discount_curve['Date'].map(lambda x : ((x- data_date).days)/360) #converte the data into the correct form
-#             SOFR_discount_rate = discount_curve['3 Month Term SOFR Forward Curve']
-            T_actual_360 = ((datetime.strptime(expiry_date, "%Y-%m-%d") - data_date).days)/360
-            T_actual_365 = ((datetime.strptime(expiry_date, "%Y-%m-%d") - data_date).days)/365
-            indexer = 0
-            integral_function = 0
-            #compute discount factor as exponent in power of integral from 'data date' to 'expiry date' based on 3 month SOFR forward rate
-            discount_factor = 1
-
-
-            
-            # estimate reference forward and use call - put parity for compute it
-            reference_forward = get_reference_forward(options_data_expiry_date, expiry_date, discount_factor, T_actual_365)
-            
-            #Make necessary adjustment and inverse solve Black-76 model respect to sigma 
-            options_data_expiry_date = computing_implied_volatility(options_data_expiry_date, reference_forward, discount_factor, T_actual_365, strike_upper_limit = 2.5, strike_lower_limit = 0.4, delta_limit = 0.001, IV_bis_ask_spread_quantile = 0.95, bid_ask = bid_ask)
-            #keep data about implied volatility
-            if not options_data_expiry_date["mid_IV"].empty:
-                Implied_Volatility_for_specific_expiry={}
-                Implied_Volatility_for_specific_expiry["expiry_date"] = expiry_date
-                Implied_Volatility_for_specific_expiry["number_of_days_from_value_date"] = T_actual_365 * 365
-                Implied_Volatility_for_specific_expiry["expiry_date_in_act365_year_fraction"] = T_actual_365
-                Implied_Volatility_for_specific_expiry["reference_forward"] = reference_forward
-                Implied_Volatility_for_specific_expiry["reference_discount_factor"] = discount_factor
-                Implied_Volatility_for_specific_expiry["strikes"] = options_data_expiry_date["strike"].tolist()
-                Implied_Volatility_for_specific_expiry["mid_implied_volatilities"] = options_data_expiry_date["mid_IV"].tolist()
-                if bid_ask:
-                    Implied_Volatility_for_specific_expiry["bid_implied_volatilities"] = options_data_expiry_date["bid_IV"].tolist()
-                    Implied_Volatility_for_specific_expiry["ask_implied_volatilities"] = options_data_expiry_date["ask_IV"].tolist()
-
-                Implied_Volatility_surface.append(Implied_Volatility_for_specific_expiry)
-        Implied_Volatility["implied_volatility_surface"] = Implied_Volatility_surface
+    # year fractions of all expiries which are not expired yet
+    expiry_date_list = [expiry_date for expiry_date in expiry_date_list if data_date <= datetime.strptime(expiry_date, "%Y-%m-%d")]
+    T_actual_365 = pd.Series({expiry_date: ((datetime.strptime(expiry_date, "%Y-%m-%d") - data_date).days)/365 for expiry_date in expiry_date_list}, dtype=float)
+    #compute discount factor as exponent in power of integral from 'data date' to 'expiry date' based on 3 month SOFR forward rate
+    if discount_curve is None:
+        discount_curve = DiscountCurve.flat()
+    elif isinstance(discount_curve, pd.DataFrame):
+        discount_curve = DiscountCurve.from_SOFR(discount_curve, data_date)
+    discount_factor = pd.Series(discount_curve.discount_factor(T_actual_365.to_numpy()), index=T_actual_365.index)
+    options_data_by_expiry = dict(tuple(options_data.loc[options_data["expiryDate"].isin(expiry_date_list)].groupby("expiryDate", sort=False)))
+    expiry_date_list = [expiry_date for expiry_date in expiry_date_list if expiry_date in options_data_by_expiry]
+    
+    if executor is None:
+        # estimate reference forwards and market implied discount factors for all expiries at once via call - put parity regression
+        reference_forwards = get_reference_forwards(options_data.loc[options_data["expiryDate"].isin(expiry_date_list)], T_actual_365, discount_factor, implied_discount_factor=implied_discount_factor)
+        Implied_Volatility_surface = [get_Implied_volatility_for_expiry(options_data_by_expiry[expiry_date], expiry_date, T_actual_365[expiry_date], discount_factor[expiry_date], bid_ask, reference_forwards.loc[expiry_date]) for expiry_date in expiry_date_list]
+    else:
+        # each expiry estimates its own reference forward and implied volatility in a separate worker
+        pool = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}[executor]
+        with pool(max_workers=max_workers) as pool_executor:
+            futures = [pool_executor.submit(get_Implied_volatility_for_expiry, options_data_by_expiry[expiry_date], expiry_date, T_actual_365[expiry_date], discount_factor[expiry_date], bid_ask, None, implied_discount_factor) for expiry_date in expiry_date_list]
+            Implied_Volatility_surface = [future.result() for future in futures]
+    
+    Implied_Volatility["implied_volatility_surface"] = [k for k in Implied_Volatility_surface if k is not None]
+    if vol_surface:
+        return VolSurface.from_dict(Implied_Volatility)
         
     return Implied_Volatility
+
+#--------------------------------------------------------------------------------    
+'''
+Function estimates reference forward (if it is not given) and computes implied volatility for one expiry date.
+Function returns dictionary with implied volatility for given expiry date or None if no options are left after filtering.
+'''
+def get_Implied_volatility_for_expiry(options_data_expiry_date, expiry_date, T_actual_365, discount_factor, bid_ask=True, reference_forward=None, implied_discount_factor=True):
+    if reference_forward is None:
+        reference_forward = get_reference_forwards(options_data_expiry_date, {expiry_date: T_actual_365}, discount_factor, implied_discount_factor=implied_discount_factor).loc[expiry_date]
+    discount_factor = float(reference_forward["reference_discount_factor"])
+    reference_forward = float(reference_forward["reference_forward"])
+    
+    #Make necessary adjustment and inverse solve Black-76 model respect to sigma 
+    options_data_expiry_date = computing_implied_volatility(options_data_expiry_date, reference_forward, discount_factor, T_actual_365, strike_upper_limit = 2.5, strike_lower_limit = 0.4, delta_limit = 0.001, IV_bis_ask_spread_quantile = 0.95, bid_ask = bid_ask)
+    #keep data about implied volatility
+    if options_data_expiry_date["mid_IV"].empty:
+        return None
+    Implied_Volatility_for_specific_expiry={}
+    Implied_Volatility_for_specific_expiry["expiry_date"] = expiry_date
+    Implied_Volatility_for_specific_expiry["number_of_days_from_value_date"] = T_actual_365 * 365
+    Implied_Volatility_for_specific_expiry["expiry_date_in_act365_year_fraction"] = T_actual_365
+    Implied_Volatility_for_specific_expiry["reference_forward"] = reference_forward
+    Implied_Volatility_for_specific_expiry["reference_discount_factor"] = discount_factor
+    Implied_Volatility_for_specific_expiry["strikes"] = options_data_expiry_date["strike"].tolist()
+    Implied_Volatility_for_specific_expiry["mid_implied_volatilities"] = options_data_expiry_date["mid_IV"].tolist()
+    if bid_ask:
+        Implied_Volatility_for_specific_expiry["bid_implied_volatilities"] = options_data_expiry_date["bid_IV"].tolist()
+        Implied_Volatility_for_specific_expiry["ask_implied_volatilities"] = options_data_expiry_date["ask_IV"].tolist()
+    return Implied_Volatility_for_specific_expiry
         
 
 #--------------------------------------------------------------------------------    
@@ -79,26 +109,25 @@ def computing_implied_volatility(options_data_expiry_date, reference_forward, di
         # filter to bondary condition with moneyness
     options_data_expiry_date.drop(options_data_expiry_date[ (options_data_expiry_date.strike<strike_lower_limit*reference_forward) | (options_data_expiry_date.strike>strike_upper_limit*reference_forward)].index, inplace=True)
     
-        #compute IV for bid, ask, mid
-    options_data_expiry_date["mid_IV"] = options_data_expiry_date.apply(lambda x: black_implied_vol(x.mid * discount_factor, reference_forward, x.strike, T_actual_365, x.optionType), axis=1)
+        #compute IV for bid, ask, mid in one vectorized pass
+    sides = ["mid", "bid", "ask"] if bid_ask else ["mid"]
+    n = len(options_data_expiry_date)
+    prices = np.concatenate([options_data_expiry_date[side].to_numpy(dtype=float) / discount_factor for side in sides]) # undiscounted prices
+    strikes = np.tile(options_data_expiry_date["strike"].to_numpy(dtype=float), len(sides))
+    option_types = np.tile(options_data_expiry_date["optionType"].to_numpy(), len(sides))
+    IV, iterations, converged = black_implied_vol_batch(prices, reference_forward, strikes, T_actual_365, option_types)
+    for i, side in enumerate(sides):
+        options_data_expiry_date[side + "_IV"] = IV[i*n:(i+1)*n]
+        options_data_expiry_date[side + "_IV_iterations"] = iterations[i*n:(i+1)*n]
+        options_data_expiry_date[side + "_IV_converged"] = converged[i*n:(i+1)*n]
+    options_data_expiry_date.drop(options_data_expiry_date.index[~np.isfinite(options_data_expiry_date["mid_IV"])], inplace=True)
     if bid_ask:
-        options_data_expiry_date["ask_IV"] = options_data_expiry_date.apply(lambda x: black_implied_vol(x.ask * discount_factor, reference_forward, x.strike, T_actual_365, x.optionType), axis=1)
-        options_data_expiry_date["bid_IV"] = options_data_expiry_date.apply(lambda x: black_implied_vol(x.bid * discount_factor, reference_forward, x.strike, T_actual_365, x.optionType), axis=1)
         options_data_expiry_date["IV_bid_ask_spread"] = options_data_expiry_date["ask_IV"] - options_data_expiry_date["bid_IV"]
-        options_data_expiry_date.drop(options_data_expiry_date.index[ (options_data_expiry_date["bid_IV"]<0.0) | (options_data_expiry_date["ask_IV"]<0.0)], inplace=True)
+        options_data_expiry_date.drop(options_data_expiry_date.index[ ~(options_data_expiry_date["bid_IV"]>0.0) | ~(options_data_expiry_date["ask_IV"]>0.0)], inplace=True)
         
          #Filter data based on delta criteria
-    for strike in options_data_expiry_date["strike"]:
-        if strike > reference_forward:
-            optionType ='calls' 
-        else: 
-            optionType='puts'
-        
-        if not (options_data_expiry_date.loc[(options_data_expiry_date["strike"]==strike) & (options_data_expiry_date["optionType"]== optionType)]["mid_IV"]).empty:
-            IV = options_data_expiry_date.loc[(options_data_expiry_date["strike"]==strike) & (options_data_expiry_date["optionType"]== optionType)]["mid_IV"].item()
-            delta = black_delta_formula(reference_forward, strike, T_actual_365, IV, optionType)
-            if abs(delta)<=delta_limit:
-                options_data_expiry_date.drop(options_data_expiry_date.index[options_data_expiry_date["strike"]==strike], inplace=True)
+    delta = black_delta_formula(reference_forward, options_data_expiry_date["strike"].to_numpy(dtype=float), T_actual_365, options_data_expiry_date["mid_IV"].to_numpy(dtype=float), options_data_expiry_date["optionType"].to_numpy())
+    options_data_expiry_date = options_data_expiry_date.loc[np.abs(delta) > delta_limit]
 
 #     #cleaning of remaining data based on the size of the bid-ask spread
 #     bid_ask_spread_limit =  options_data_expiry_date["IV_bid_ask_spread"].quantile(IV_bis_ask_spread_quantile)
@@ -109,91 +138,123 @@ def computing_implied_volatility(options_data_expiry_date, reference_forward, di
 
 #--------------------------------------------------------------------------------
 '''
-Function estimates reference forward and finds nearest call and put contract for computing exact forward value via call-put parity.
-Function returns reference forward value.
+Function estimates reference forwards and discount factors for all expiry dates at once.
+Calls and puts are paired by (expiry date, strike) in one merge, for each expiry the pairs nearest to the approximate forward are kept
+and call - put parity C - P = DF * (F - K) is fitted by least squares, i.e. C - P = alpha + beta * K with DF = -beta and F = alpha / DF.
+If there is only one pair (or the fitted discount factor is out of discount_factor_bounds, or implied_discount_factor=False) given discount factor is used, if there are no pairs approximate forward is kept.
+The upper bound 1.0 rejects fitted discount factors above 1 (negative rates).
+Function returns dataframe indexed by expiry date with reference forward, reference discount factor and number of used pairs.
 '''
-def get_reference_forward(options_data_expiry_date, expiry_date, discount_factor, T_actual_365):
-    reference_spot= options_data_expiry_date["last close"].iloc[0]
-    dividend_yield = options_data_expiry_date["yFinance_dividend_yield"].iloc[0]
-    reference_forward = reference_spot * discount_factor * np.exp(- dividend_yield * (T_actual_365)) #estimate approximately reference forward value, no repo rate
+def get_reference_forwards(options_data, T_actual_365, discount_factor=1, number_of_strikes=4, discount_factor_bounds=(0.5, 1.0), implied_discount_factor=True):
+    expiries = pd.DataFrame({"T": pd.Series(T_actual_365, dtype=float)})
+    expiries.index.name = "expiryDate"
+    expiries["discount_factor"] = pd.Series(discount_factor, index=expiries.index, dtype=float)
+    reference_spot = options_data.groupby("expiryDate")["last close"].first().astype(float)
+    dividend_yield = options_data.groupby("expiryDate")["yFinance_dividend_yield"].first().astype(float)
+    #estimate approximately reference forward value, no repo rate
+    expiries["approximate_forward"] = reference_spot.reindex(expiries.index) / expiries["discount_factor"] * np.exp(- dividend_yield.reindex(expiries.index) * expiries["T"])
     
-    #find call and put option nearest to estimated reference forward value
-    optionsTduplicateStrikes = options_data_expiry_date[options_data_expiry_date.duplicated(["strike"], keep=False)]
-    optionsTduplicateStrikes = optionsTduplicateStrikes.sort_values(by=['strike'], ascending = [False])
+    # pair calls and puts with the same strike and keep pairs nearest to the approximate forward
+    calls = options_data.loc[options_data["optionType"] == 'calls', ["expiryDate", "strike", "mid"]]
+    puts = options_data.loc[options_data["optionType"] == 'puts', ["expiryDate", "strike", "mid"]]
+    pairs = calls.merge(puts, on=["expiryDate", "strike"], suffixes=("_call", "_put"))
+    pairs["distance"] = np.abs(pairs["strike"] - pairs["expiryDate"].map(expiries["approximate_forward"]))
+    pairs = pairs.sort_values(by=["expiryDate", "distance"])
+    pairs = pairs.loc[pairs.groupby("expiryDate").cumcount() < number_of_strikes]
+    pairs["y"] = pairs["mid_call"] - pairs["mid_put"]
+    pairs["Ky"] = pairs["strike"] * pairs["y"]
+    pairs["KK"] = pairs["strike"] ** 2
     
-    if (len(optionsTduplicateStrikes)==0): #we don't use call put parity, becuase we haven't any contracts
-        return reference_forward
-
-    elif len(optionsTduplicateStrikes) == 2: #there are two lines, hence only one strike
-        strike = optionsTduplicateStrikes.iloc[0]["strike"].item()
-        mid_call_price = optionsTduplicateStrikes.loc[(optionsTduplicateStrikes["strike"]==strike) & (optionsTduplicateStrikes["optionType"]=='calls')]["mid"].item()
-        mid_put_price = optionsTduplicateStrikes.loc[(optionsTduplicateStrikes["strike"]==strike) & (optionsTduplicateStrikes["optionType"]=='puts')]["mid"].item()
-        reference_forward = (mid_call_price - mid_put_price) * discount_factor + strike
-    
-    elif (optionsTduplicateStrikes[optionsTduplicateStrikes["strike"] > reference_forward]["strike"]).empty:
-        return reference_forward
-    
-    elif optionsTduplicateStrikes[optionsTduplicateStrikes["strike"] < reference_forward]["strike"].empty:
-        return reference_forward
+    # least squares fit of C - P = alpha + beta * K for every expiry via grouped sums
+    sums = pairs.groupby("expiryDate").agg(n=("strike", "size"), K=("strike", "sum"), y=("y", "sum"), Ky=("Ky", "sum"), KK=("KK", "sum")).reindex(expiries.index, fill_value=0)
+    denominator = sums["n"] * sums["KK"] - sums["K"] ** 2
+    beta = (sums["n"] * sums["Ky"] - sums["K"] * sums["y"]) / denominator.where(denominator > 0)
+    alpha = (sums["y"] - beta * sums["K"]) / sums["n"]
+    fitted_discount_factor = -beta
+    regression = implied_discount_factor & (sums["n"] >= 2) & (fitted_discount_factor >= discount_factor_bounds[0]) & (fitted_discount_factor <= discount_factor_bounds[1])
     
-    elif optionsTduplicateStrikes[optionsTduplicateStrikes["strike"] > reference_forward]["strike"].empty:
-        return reference_forward
-
-    else : #regular case, i.e. len(optionsTduplicateStrikes)>=4
-        strikes = find_neighbours(reference_forward,  optionsTduplicateStrikes, "strike")
-        #computing of the adjusted reference forward from the strike just below the reference forward
-        strike_below_fwd = optionsTduplicateStrikes.loc[strikes[0]]["strike"]
-        mid_call_price = optionsTduplicateStrikes.loc[(optionsTduplicateStrikes["strike"]==strike_below_fwd) & (optionsTduplicateStrikes["optionType"]=='calls')]["mid"].item()
-        mid_put_price = optionsTduplicateStrikes.loc[(optionsTduplicateStrikes["strike"]==strike_below_fwd) & (optionsTduplicateStrikes["optionType"]=='puts')]["mid"].item()
-        fwd_from_strike_below_fwd = (mid_call_price-mid_put_price) * discount_factor + strike_below_fwd
-        #computing of the adjusted reference forward from the strike justabove the reference forward
-        strike_above_fwd = optionsTduplicateStrikes.loc[strikes[1]]["strike"]
-        mid_call_price = optionsTduplicateStrikes.loc[(optionsTduplicateStrikes["strike"]==strike_above_fwd) & (optionsTduplicateStrikes["optionType"]=='calls')]["mid"].item()
-        mid_put_price = optionsTduplicateStrikes.loc[(optionsTduplicateStrikes["strike"]==strike_above_fwd) & (optionsTduplicateStrikes["optionType"]=='puts')]["mid"].item()
-        fwd_from_strike_above_fwd = (mid_call_price-mid_put_price) * discount_factor + strike_above_fwd
-        #average of previous results
-        reference_forward = (fwd_from_strike_below_fwd+fwd_from_strike_above_fwd)/2
-
-    return reference_forward
+    reference_forwards = pd.DataFrame(index=expiries.index)
+    reference_forwards["reference_discount_factor"] = fitted_discount_factor.where(regression, expiries["discount_factor"])
+    # without regression every pair gives forward K + (C - P) / DF, take the average
+    parity_forward = (sums["K"] + sums["y"] / expiries["discount_factor"]) / sums["n"]
+    reference_forwards["reference_forward"] = (alpha / fitted_discount_factor).where(regression, parity_forward.where(sums["n"] > 0, expiries["approximate_forward"]))
+    reference_forwards["number_of_pairs"] = sums["n"]
+    return reference_forwards
 
-#---------------------------------
-#Functions finds the nearest call and put contracts for given reference forward
-def find_neighbours(value, df, colname):
-    exactmatch = df[df[colname] == value]
-    if not exactmatch.empty:
-        return exactmatch.index
-    else:
-        lowerneighbour_ind = df[df[colname] < value][colname].idxmax()
-        upperneighbour_ind = df[df[colname] > value][colname].idxmin()
-        return [lowerneighbour_ind, upperneighbour_ind]
+#--------------------------------------------------------------------------------
+'''
+Function estimates reference forward for given expiry date via call - put parity.
+Function returns reference forward value.
+'''
+def get_reference_forward(options_data_expiry_date, expiry_date, discount_factor, T_actual_365):
+    return get_reference_forwards(options_data_expiry_date, {expiry_date: T_actual_365}, discount_factor).loc[expiry_date, "reference_forward"]
 
 #---------------------------------
 #Functions compute first derivative by the forward price    
 def black_delta_formula(F, K, T, sigma, optionType):
-    stddev = sigma*np.sqrt(T)
-    d1 = np.log(F/K)/stddev + 0.5*stddev
-    eps = 1.0 if optionType == 'calls' else -1.0
-    return eps *norm.cdf(eps*d1)
+    return black_76(F, K, T, sigma, optionType)["delta"]
     
 #---------------------------------
 #Functions compute implied volatility via Newton Raphson method for given parameters   
 def black_implied_vol(undiscounted_price, F, K, T, optionType, initial_guess = 0.5):
-    target_price = undiscounted_price
-    eps = 1.0 if optionType == 'calls' else -1.0
-    MAX_ITERATIONS = 200
-    PRECISION = min(1.0e-5, target_price/F)
-    sigma = initial_guess
-    for i in range(0, MAX_ITERATIONS):
-        stddev = sigma*np.sqrt(T)
-        d1 = np.log(F/K)/stddev + 0.5*stddev
-        d2 = d1 - stddev
-        price = eps *(F * norm.cdf(eps*d1) - K * norm.cdf(eps*d2))
-        vega = F * norm.pdf(d1) * np.sqrt(T)
-        diff = target_price - price
-        if (vega<=np.finfo(float).eps):
-            return initial_guess #likely to be far off the money anyway....
-        if (abs(diff) < PRECISION):
-            return sigma
-        sigma = sigma + diff/vega # Newton–Raphson
-    return sigma # if MAX_ITERATIONS, return estimate so far
+    sigma, iterations, converged = black_implied_vol_batch(undiscounted_price, F, K, T, optionType)
+    return sigma.item() if np.isfinite(sigma) else initial_guess #likely to be far off the money anyway....
 
+#---------------------------------
+'''
+Function computes implied volatility for arrays of option prices in one NumPy pass (all strikes, sides and expiries at once).
+Safeguarded Newton-Raphson: every contract keeps a bracket [sigma_low, sigma_high] and a Newton step which leaves the bracket
+(or has too small vega) is replaced by bisection. Initial guess is the rational approximation of Corrado and Miller.
+Prices outside of no-arbitrage bounds get NaN implied volatility.
+Function returns arrays of implied volatilities, number of iterations and convergence flags.
+'''
+def black_implied_vol_batch(undiscounted_price, F, K, T, optionType, sigma_low = 1e-6, sigma_high = 20.0, MAX_ITERATIONS = 100, PRECISION = 1.0e-10):
+    target_price, F, K, T, eps = np.broadcast_arrays(np.asarray(undiscounted_price, dtype=float), np.asarray(F, dtype=float), np.asarray(K, dtype=float), np.asarray(T, dtype=float), get_option_sign(optionType))
+    shape = target_price.shape
+    target_price, F, K, T, eps = (np.ravel(v) for v in (target_price, F, K, T, eps))
+    sqrt_T = np.sqrt(T)
+    
+    # prices have to be within no-arbitrage bounds: max(eps*(F-K), 0) < price < F (calls) or K (puts)
+    intrinsic = np.maximum(eps * (F - K), 0.0)
+    upper_bound = np.where(eps > 0, F, K)
+    feasible = (target_price > intrinsic) & (target_price < upper_bound) & (T > 0)
+    
+    # initial guess by Corrado-Miller formula written for the call price (puts are converted via call-put parity)
+    call_price = np.where(eps > 0, target_price, target_price + F - K)
+    half_diff = call_price - (F - K) / 2
+    stddev_guess = np.sqrt(2 * np.pi) / (F + K) * (half_diff + np.sqrt(np.maximum(half_diff**2 - (F - K)**2 / np.pi, 0.0)))
+    
+    sigma_low = np.full(target_price.shape, sigma_low)
+    sigma_high = np.full(target_price.shape, sigma_high)
+    sigma = np.where(feasible, stddev_guess / np.where(sqrt_T > 0, sqrt_T, 1.0), np.nan)
+    sigma = np.where(feasible & ~((sigma > sigma_low) & (sigma < sigma_high)), np.sqrt(sigma_low * sigma_high), sigma)
+    price_precision = PRECISION * np.maximum(target_price, 1.0)
+    
+    iterations = np.zeros(target_price.shape, dtype=int)
+    converged = np.zeros(target_price.shape, dtype=bool)
+    active = feasible.copy()
+    for i in range(0, MAX_ITERATIONS):
+        if not active.any():
+            break
+        s, ll, hh, tp = sigma[active], sigma_low[active], sigma_high[active], target_price[active]
+        black = black_76(F[active], K[active], T[active], s, eps[active])
+        vega = black["vega"]
+        diff = tp - black["price"]
+        iterations[active] += 1
+        
+        # price is increasing in sigma, so the sign of the difference shrinks the bracket
+        ll = np.where(diff > 0, s, ll)
+        hh = np.where(diff < 0, s, hh)
+        done = (np.abs(diff) < price_precision[active]) | (hh - ll < PRECISION * s)
+        
+        newton = s + diff / np.where(vega > np.finfo(float).eps, vega, np.nan) # Newton–Raphson
+        s_new = np.where((newton > ll) & (newton < hh), newton, 0.5 * (ll + hh)) # bisection if Newton leaves the bracket
+        
+        index = np.flatnonzero(active)
+        sigma[index] = np.where(done, s, s_new)
+        sigma_low[index] = ll
+        sigma_high[index] = hh
+        converged[index] = done
+        active[index[done]] = False
+    
+    return sigma.reshape(shape), iterations.reshape(shape), converged.reshape(shape)
@@ -1,68 +1,46 @@
 import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
-from scipy.stats import norm
+from Black_76 import black_76
+from SVI_calibrator import SVI
 from SVI_curves import get_w_SVI_raw
 
 #----------------------------------------------------------------------------
 '''
 Function computes option prices for given implied volatility
+Parameters of every expiry are merged onto the rows of option chain, implied volatility from SVI and Black 76 prices of calls and puts are computed for all rows at once.
 Function returns dataframe with option prices
 '''
 def get_data_about_option(data_dict, options_data, optionTypes=None): 
-    low_limit = 0.1
-    high_limit = 2.5
-    N = 1000
-    value_options = pd.DataFrame(columns=['x_grid', 'IV', 'value_option', 'expiry_date','expiry_date_in_act365_year_fraction','optionType', 'strike', 'bid', 'ask'])
-#     options_data = pd.read_csv(filename)
+    columns = ['x_grid', 'IV', 'value_option', 'expiry_date','expiry_date_in_act365_year_fraction','optionType', 'strike', 'bid', 'ask']
     
-    for k in data_dict["implied_volatility_surface"]:
-        Option_value = pd.DataFrame()
-        set_param_raw = k['set_param_raw']
-        T = k['expiry_date_in_act365_year_fraction']
-        F = k['reference_forward']
-        expiry_date = k['expiry_date']
-        discount_factor = k['reference_discount_factor']
-        
-        #if necessary keep only out of the market options
-        if optionTypes == 'OTM':
-            options_data_expiry_date = options_data.loc[options_data["expiryDate"]==expiry_date]
-            options_data_expiry_date = options_data_expiry_date.loc[((options_data_expiry_date["strike"] >= F) & (options_data_expiry_date["optionType"] == "calls")) | ((options_data_expiry_date["strike"] < F) & (options_data_expiry_date["optionType"] == 'puts'))]
-            options_data_expiry_date = options_data_expiry_date.sort_values(by=['strike'])
-        else: 
-            options_data_expiry_date = options_data
-        
-        stirkes = (options_data_expiry_date.loc[options_data_expiry_date["expiryDate"]==expiry_date])['strike'] # take all strikes for this expirations
-        optinType = (options_data_expiry_date.loc[options_data_expiry_date["expiryDate"]==expiry_date])['optionType'] # take corresponding calls and puts
-        
-        for ind,j in enumerate(stirkes.unique()):
-            x = np.log(j/F) # compute log moneyness
-            IV = np.sqrt(get_w_SVI_raw(set_param_raw, x) / T) # compute implied volatility from SVI model
-            bid_ask = options_data_expiry_date.loc[(options_data_expiry_date["expiryDate"]==expiry_date) & (options_data_expiry_date["strike"]==j)] # take bid ask spread correspond given strike
-            optionType = (options_data_expiry_date.loc[(options_data_expiry_date["expiryDate"]==expiry_date) & (options_data_expiry_date["strike"]==j)])['optionType'] # take option type (call and put) correspond given strike
-            
-            #compute option prices via Black 76 model
-            if len(optionType) == 2: # we have put and call correspond to this strike
-                Calls = black_price_formula(F, j, T, IV, 'calls') 
-                Puts = black_price_formula(F, j, T, IV, 'puts')
-                bid_ask_calls = bid_ask.loc[bid_ask['optionType'] == 'calls']
-                bid_ask_puts = bid_ask.loc[bid_ask['optionType'] == 'puts']
-                Option_value = pd.concat([Option_value, pd.DataFrame([np.exp(x), IV, Calls / discount_factor , expiry_date, T, 'calls', j, bid_ask_calls['bid'].item(), bid_ask_calls['ask'].item()]).T])
-                Option_value = pd.concat([Option_value, pd.DataFrame([np.exp(x), IV, Puts / discount_factor, expiry_date, T, 'puts', j,bid_ask_puts['bid'].item(), bid_ask_puts['ask'].item()]).T])
-            else:
-                if (optionType.iloc[0] == 'calls'): # we have only call correspond to this strike
-                    Calls = black_price_formula(F, j, T, IV, 'calls')
-                    Option_value = pd.concat([Option_value, pd.DataFrame([np.exp(x), IV, Calls / discount_factor, expiry_date, T,'calls', j,bid_ask['bid'].item(), bid_ask['ask'].item()]).T])
-                else:  # we have only put correspond to this strike
-                    Puts = black_price_formula(F, j, T, IV, 'puts')
-                    Option_value = pd.concat([Option_value, pd.DataFrame([np.exp(x), IV, Puts / discount_factor, expiry_date, T,'puts', j,bid_ask['bid'].item(), bid_ask['ask'].item()]).T])
-        
-        Option_value.columns = ['x_grid', 'IV', 'value_option', 'expiry_date','expiry_date_in_act365_year_fraction','optionType', 'strike', 'bid', 'ask']
-
-        value_options = pd.concat([value_options, Option_value])
-        
-        # find such option prices, which are within the initial bid ask spread
-        value_options['correct_price'] = value_options.apply(lambda x: 'inside' if ((x.value_option <= x.ask) & (x.value_option >= x.bid)) else ('below' if (x.value_option < x.bid) else 'above'), axis=1) 
+    # parameters of every expiry
+    expiry_params = pd.DataFrame([{'expiryDate': k['expiry_date'], 'expiry_number': number, 'T': k['expiry_date_in_act365_year_fraction'],
+                                   'F': k['reference_forward'], 'discount_factor': k['reference_discount_factor'],
+                                   'a': k['set_param_raw'].a, 'b': k['set_param_raw'].b, 'rho': k['set_param_raw'].rho, 'm': k['set_param_raw'].m, 'sigma': k['set_param_raw'].sigma}
+                                  for number, k in enumerate(data_dict["implied_volatility_surface"])])
+    if expiry_params.empty:
+        return pd.DataFrame(columns=columns + ['correct_price'])
+    rows = options_data[['expiryDate', 'strike', 'optionType', 'bid', 'ask']].merge(expiry_params, on='expiryDate') # take all options for calibrated expirations
+    
+    #if necessary keep only out of the market options
+    if optionTypes == 'OTM':
+        rows = rows.loc[((rows["strike"] >= rows["F"]) & (rows["optionType"] == "calls")) | ((rows["strike"] < rows["F"]) & (rows["optionType"] == 'puts'))]
+    rows = rows.sort_values(by=['expiry_number', 'strike', 'optionType'], kind='stable')
+    
+    strike, F, T = rows['strike'].to_numpy(dtype=float), rows['F'].to_numpy(dtype=float), rows['T'].to_numpy(dtype=float)
+    x = np.log(strike/F) # compute log moneyness
+    w = get_w_SVI_raw(SVI(*(rows[p].to_numpy(dtype=float) for p in ['a', 'b', 'rho', 'm', 'sigma'])), x) # SVI total variance with parameters of every row
+    IV = np.sqrt(w / T) # compute implied volatility from SVI model
+    value_option = black_price_formula(F, strike, T, IV, rows['optionType'].to_numpy()) * rows['discount_factor'].to_numpy() #compute option prices via Black 76 model
+    
+    value_options = pd.DataFrame({'x_grid': np.exp(x), 'IV': IV, 'value_option': value_option, 'expiry_date': rows['expiryDate'].to_numpy(),
+                                  'expiry_date_in_act365_year_fraction': T, 'optionType': rows['optionType'].to_numpy(), 'strike': strike,
+                                  'bid': rows['bid'].to_numpy(), 'ask': rows['ask'].to_numpy()}, columns=columns)
+    
+    # find such option prices, which are within the initial bid ask spread
+    bid, ask = value_options['bid'].to_numpy(), value_options['ask'].to_numpy()
+    value_options['correct_price'] = np.select([(value_option <= ask) & (value_option >= bid), value_option < bid], ['inside', 'below'], 'above')
             
     return value_options
 
@@ -70,8 +48,4 @@ def get_data_about_option(data_dict, options_data, optionTypes=None):
 #----------------------------------------------------------------------------
 #Functions compute option value for given parameters 
 def black_price_formula(F, K, T, sigma, optionType):
-        stddev = sigma*np.sqrt(T)
-        d1 = np.log(F/K)/stddev + 0.5*stddev
-        d2 = d1 - stddev
-        eps = 1.0 if optionType == 'calls' else -1.0
-        return eps *(F * norm.cdf(eps*d1) - K * norm.cdf(eps*d2))
\ No newline at end of file
+        return black_76(F, K, T, sigma, optionType)["price"]
\ No newline at end of file
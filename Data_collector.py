@@ -0,0 +1,108 @@
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from Data_scrapping import get_bulk_data_about_crypto_options, get_funding_rate, save_crypto_options
+from Deribit_client import DeribitClient, InstrumentCache
+from Market_curves import ForwardCurve
+
+logger = logging.getLogger(__name__)
+
+#----------------------------------------------------------------------------
+'''
+Function collects one snapshot of option chain of currency (bulk mode) and saves it in the format of get_data_about_crypto_options.
+Last close of every option is the forward for its expiry, interpolated on the curve of futures prices from spot (estimated delivery price),
+beyond the last future it is extrapolated with the funding rate of the perpetual.
+Function returns number of saved options.
+'''
+def collect_crypto_options(currency, client, instrument_cache=None, catalog=None, store=None, with_seconds=False):
+    current_time = str(datetime.now().date())
+
+    #get option chain and futures prices in USD from summaries of order books (few requests, all quotes at the same moment)
+    data_options, futures_price = get_bulk_data_about_crypto_options(currency, client, instrument_cache)
+    futures_price['Date'] = (pd.to_datetime(futures_price['expiryDate']) - pd.Timestamp(current_time)).dt.days / 365
+    spot = float(data_options['last close'].iloc[0]) if len(data_options) else None
+    forward_curve = ForwardCurve.from_futures(futures_price['Date'], futures_price['Price'], spot, get_funding_rate(currency, client))
+
+    #making necessary adjustment
+    T_actual_365 = (pd.to_datetime(data_options['expiryDate']) - pd.Timestamp(current_time)).dt.days / 365
+    data_options['last close'] = forward_curve.forward(T_actual_365.to_numpy(dtype=float)) # forward for every option in one lookup
+
+    if store is None:
+        os.makedirs('DATA//Crypto_currencies//' + currency, exist_ok=True)
+    save_crypto_options(data_options, currency, with_seconds=with_seconds, store=store, catalog=catalog)
+    return len(data_options)
+
+# first time after now (unix time, s) on the grid offset + k * cadence: runs stay aligned to the clock, missed runs are skipped instead of queued
+def get_next_run_time(now, cadence, offset=0.0):
+    return offset + ((now - offset) // cadence + 1) * cadence
+
+#----------------------------------------------------------------------------
+'''
+Collector daemon: option chains of currencies are collected in one long-running process, every currency in its own thread with its own cadence (seconds),
+at aligned times offset + k * cadence (no drift: the next run does not depend on duration of the previous one, a run which is late is skipped).
+All threads share one DeribitClient (keep-alive session, rate limit, retries) and one InstrumentCache, so lists of instruments are not requested every cycle.
+File names get seconds for cadences shorter than a minute. Failed cycle is logged and the currency is collected again at its next run time.
+stop() (called on SIGTERM and SIGINT by run_forever) lets running cycles finish, no snapshot is left half written.
+'''
+class CollectorDaemon:
+    def __init__(self, cadences, client=None, instrument_cache=None, catalog=None, store=None, offset=0.0, collect=collect_crypto_options):
+        self.cadences = dict(cadences)
+        self.client = client or DeribitClient()
+        self.instrument_cache = instrument_cache or InstrumentCache(self.client)
+        self.catalog = catalog
+        self.store = store
+        self.offset = offset
+        self.collect = collect
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    # collection loop of one currency
+    def run_currency(self, currency, cadence, immediately=False):
+        next_run = time.time() if immediately else get_next_run_time(time.time(), cadence, self.offset)
+        while not self.stop_event.wait(max(0.0, next_run - time.time())):
+            start = time.time()
+            try:
+                number_of_options = self.collect(currency, self.client, self.instrument_cache, catalog=self.catalog, store=self.store, with_seconds=cadence < 60)
+                logger.info('%s: %d options collected in %.1f s', currency, number_of_options, time.time() - start)
+            except Exception:
+                logger.exception('%s: collection failed', currency)
+            next_run = get_next_run_time(time.time(), cadence, self.offset)
+
+    # starts thread of every currency (with immediately=True the first collection is made at start)
+    def start(self, immediately=False):
+        self.stop_event.clear()
+        self.threads = [threading.Thread(target=self.run_currency, args=(currency, cadence, immediately), name='collector-' + currency)
+                        for currency, cadence in self.cadences.items()]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+
+    # runs until SIGTERM or SIGINT, then waits for running cycles and closes the session
+    def run_forever(self, immediately=False):
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signal_number, lambda signal_number, frame: self.stop())
+        self.start(immediately)
+        while any(thread.is_alive() for thread in self.threads):
+            self.join(timeout=1.0) # main thread stays responsive to signals
+        self.client.close()
+        if self.catalog is not None:
+            self.catalog.close()
+        logger.info('collector stopped')
+
+    # collects every currency once, concurrently, returns numbers of saved options
+    def run_once(self):
+        with ThreadPoolExecutor(max_workers=len(self.cadences) or 1) as pool:
+            futures = [pool.submit(self.collect, currency, self.client, self.instrument_cache, catalog=self.catalog, store=self.store) for currency in self.cadences]
+            return [future.result() for future in futures]
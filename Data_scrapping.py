@@ -3,108 +3,230 @@ from datetime import datetime, timedelta
 from yahooquery import Ticker
 import numpy as np
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
+import time
 from time import mktime
+from Deribit_client import DeribitClient, DeribitStream, InstrumentCache
+import asyncio
 
-def get_market_data_about_option_chain_for_computing_implied_volatility(tickers_set):
-    # Function to retrieve the option chain listed for specified tickers 
-    # Making new dir in your folder and retriving data about option chain
+#----------------------------------------------------------------------------
+'''
+Cache of annual dividends per share of tickers, kept for ttl (dividends change quarterly).
+'''
+class DividendCache:
+    def __init__(self, ttl=timedelta(days=7)):
+        self.ttl = ttl
+        self.data = {}
+
+    def get(self, ticker, now=None):
+        now = now or datetime.now()
+        if ticker in self.data and now - self.data[ticker][0] < self.ttl:
+            return self.data[ticker][1]
+        return None
+
+    def put(self, ticker, annual_dividends, now=None):
+        self.data[ticker] = (now or datetime.now(), annual_dividends)
+
+dividend_cache = DividendCache()
+
+#----------------------------------------------------------------------------
+'''
+Function to retrieve the option chain listed for specified tickers 
+Option chains, last close prices and dividends of all tickers are requested by one multi-symbol Ticker in asynchronous mode (ticker_factory, yahooquery Ticker or local stand-in),
+annual dividends (sum of dividends for trailing year) are taken from dividend_cache if they are not older than its ttl.
+Files of tickers are written concurrently by max_workers threads.
+'''
+def get_market_data_about_option_chain_for_computing_implied_volatility(tickers_set, ticker_factory=Ticker, dividend_cache=dividend_cache, max_workers=8):
+    # retriving data about option chain
     directory = 'DATA//Option_chain//' + str(datetime.now().date()) + '_' + str(datetime.now().hour) + '-' + str(datetime.now().minute)
-    os.mkdir(directory)
-    for ticker in tickers_set:
-        data = Ticker(ticker)
-        data_options = data.option_chain
-    # making necessary adjustments
-        data_options.reset_index(inplace=True)
-        data_options.drop(['currency', 'change', 'percentChange', 'contractSize'], axis=1, inplace=True) # Drop unnecessary columns        
-        data_options.drop(data_options.loc[data_options['bid'] == 0].index, axis=0, inplace=True) # Drop options without trades
-        data_options['last close'] = (Ticker(ticker).history('1d'))['close'][0] # Obtain reference spot
-        data_options.drop((data_options.loc[data_options['strike'] > data_options['last close'] * 8]).index, axis=0, inplace=True)
-        data_options['mid'] = (data_options['ask'].add(data_options['bid'])) / 2 # Obtain mid price from bia and ask
-        data_options = data_options[['contractSymbol', 'symbol', 'lastTradeDate', 'expiration', 'strike', 'lastPrice', 'bid', 'ask', 'mid', 'volume', 'openInterest', 'impliedVolatility', 'last close', 'optionType']]
-        data_options = data_options.rename(columns={'symbol' : 'ticker', 'expiration' : 'expiryDate'})
-        
+    tickers = list(tickers_set)
+    data = ticker_factory(tickers, asynchronous=True)
+    option_chain = data.option_chain
+    if not isinstance(option_chain, pd.DataFrame): # no option chain data found
+        return
+    option_chain = option_chain.reset_index()
+    history = data.history(period='1d')
+    if not isinstance(history, pd.DataFrame) or history.empty: # no prices found (dictionary of errors)
+        return
+    last_close = history.reset_index().groupby('symbol')['close'].last() # Obtain reference spot
+    quoted = set(option_chain['symbol'])
+    tickers = [ticker for ticker in tickers if ticker in last_close.index and ticker in quoted] # skip tickers without data
+    if not tickers:
+        return
+
     # computing dividend yield
-    # dividend hypothesis is that company will pay similar dividends as before.
-        frequently_payments_each_year = len(data.dividend_history(start='2022-01-01', end='2023-01-01'))
-        average_dividends = (data.dividend_history(start='2022-01-01')).reset_index()
-        if average_dividends.empty:
-            average_dividends = 0
-        else:
-            average_dividends = average_dividends['dividends'].mean()
-        data_options['yFinance_dividend_yield'] = average_dividends * frequently_payments_each_year /  data_options['last close'].mean()
-    
-    # keeping collected data in maked dir
-        data_folder = directory + '//' + ticker + ".csv"
-        data_options.to_csv(data_folder, index= False )
+    # dividend hypothesis is that company will pay similar dividends as for the last year.
+    annual_dividends = {ticker: dividend_cache.get(ticker) for ticker in tickers}
+    missing = [ticker for ticker, dividends in annual_dividends.items() if dividends is None]
+    if missing:
+        dividend_history = ticker_factory(missing, asynchronous=True).dividend_history(start=str(datetime.now().date() - timedelta(days=365)))
+        dividends = dividend_history.reset_index().groupby('symbol')['dividends'].sum() if isinstance(dividend_history, pd.DataFrame) and not dividend_history.empty else pd.Series(dtype=float)
+        for ticker in missing:
+            annual_dividends[ticker] = float(dividends.get(ticker, 0))
+            dividend_cache.put(ticker, annual_dividends[ticker])
+
+    # keeping collected data in new dir
+    os.makedirs(directory, exist_ok=True)
+    def save(ticker, data_options):
+        data_options = get_option_chain_table(data_options, last_close[ticker], annual_dividends[ticker])
+        data_options.to_csv(directory + '//' + ticker + ".csv", index= False )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(lambda item: save(*item), [(ticker, data_options) for ticker, data_options in option_chain.groupby('symbol') if ticker in tickers]))
+
+# making necessary adjustments of option chain of one ticker
+def get_option_chain_table(data_options, last_close, annual_dividends):
+    data_options = data_options.drop(['currency', 'change', 'percentChange', 'contractSize'], axis=1, errors='ignore') # Drop unnecessary columns        
+    data_options = data_options.loc[data_options['bid'] != 0].copy() # Drop options without trades
+    data_options['last close'] = last_close
+    data_options = data_options.loc[data_options['strike'] <= data_options['last close'] * 8].copy()
+    data_options['mid'] = (data_options['ask'].add(data_options['bid'])) / 2 # Obtain mid price from bia and ask
+    data_options = data_options[['contractSymbol', 'symbol', 'lastTradeDate', 'expiration', 'strike', 'lastPrice', 'bid', 'ask', 'mid', 'volume', 'openInterest', 'impliedVolatility', 'last close', 'optionType']]
+    data_options = data_options.rename(columns={'symbol' : 'ticker', 'expiration' : 'expiryDate'})
+    data_options['yFinance_dividend_yield'] = annual_dividends / last_close
+    return data_options
         
 #----------------------------------------------------------------------------
 '''
 Function to retrieve the option chain listed for specified crypto currency from Derebit exchange 
 Making file with option Data in your current folder 
 Currency: ETH, BTC,
+Order books are fetched concurrently by client (DeribitClient), every quote keeps its fetch time (fetchTimestamp, ms).
+With store (SnapshotStore) the snapshot is written to the columnar store instead of CSV file.
 '''
 
-def get_data_about_crypto_options(currency):
+def get_data_about_crypto_options(currency, client=None, store=None):
+    client = client or DeribitClient()
     #scrapping data about curenct active option instruments
-    url = 'https://history.deribit.com/api/v2/public/get_instruments?currency=' + currency + '&kind=option&expired=false'
-    api_response = (requests.get(url)).json()
-    data_options = pd.DataFrame()
+    instruments = client.get_instruments(currency, kind='option')
     #scrapping data about curenct currency price in USD
-    url_spot = 'https://deribit.com/api/v2/public/get_index?currency=' + currency
-    spot_price = (requests.get(url_spot)).json()['result']['edp']
+    spot_price = client.get_index(currency)['edp']
+    # scrapping data about order books concurrently
+    order_books = client.get_order_books([k['instrument_name'] for k in instruments])
+
+    data_options = get_crypto_options_table(currency, instruments, order_books, spot_price)
+    save_crypto_options(data_options, currency, store=store)
+
+#----------------------------------------------------------------------------
+'''
+Bulk mode: option chain and futures prices of currency from summaries of all order books (get_book_summary_by_currency for options and futures) and lists of instruments,
+joined in one merge: 4 requests per currency instead of one request per instrument, all quotes are taken at the same moment.
+Derebit IV is mark IV of summary (summary has no bid and ask IV), spot is estimated delivery price of options.
+With instrument_cache (InstrumentCache) lists of instruments are reused across calls, then only 2 requests are made per currency.
+Function returns option chain in the format of get_data_about_crypto_options and dataframe with futures prices (instrumentName, expiryDate, Price), perpetual is excluded.
+'''
+
+def get_bulk_data_about_crypto_options(currency, client=None, instrument_cache=None):
+    client = client or DeribitClient()
+    instrument_cache = instrument_cache or InstrumentCache(client)
+    book_summary = pd.DataFrame(client.get_book_summary_by_currency(currency, kind='option'))
+    futures_summary = pd.DataFrame(client.get_book_summary_by_currency(currency, kind='future'))
+    instruments = pd.DataFrame(instrument_cache.get(currency, 'option', names=book_summary['instrument_name']))
+    futures = pd.DataFrame(instrument_cache.get(currency, 'future', names=futures_summary['instrument_name']))
+
+    options = instruments[['instrument_name', 'creation_timestamp', 'expiration_timestamp', 'strike', 'option_type']].merge(book_summary, on='instrument_name', suffixes=('', '_summary'))
+    spot_price = options['estimated_delivery_price'].to_numpy(dtype=float)
+    bid_price = options['bid_price'].fillna(0).to_numpy(dtype=float)
+    ask_price = options['ask_price'].fillna(0).to_numpy(dtype=float)
+    data_options = pd.DataFrame({'instrumentName': options['instrument_name'], 'lastTradeDate': get_date_strings(options['creation_timestamp'], with_time=True),
+                                 'expiryDate': get_date_strings(options['expiration_timestamp']), 'strike': options['strike'],
+                                 'optionType': options['option_type'].replace({'call': 'calls', 'put': 'puts'}), 'last close': spot_price,
+                                 'bid': bid_price * spot_price, 'ask': ask_price * spot_price, 'mid': (ask_price + bid_price) / 2 * spot_price,
+                                 'volume': options['volume'], 'openInterest': options['open_interest'], 'DerebitIV': options['mark_iv'],
+                                 'fetchTimestamp': options['fetch_timestamp'], 'yFinance_dividend_yield': 0, 'ticker': currency})
+    data_options = data_options.loc[(data_options['bid'] != 0) & (data_options['ask'] != 0)]
+
+    futures = futures.loc[futures['settlement_period'] != 'perpetual', ['instrument_name', 'expiration_timestamp']].merge(futures_summary[['instrument_name', 'last']], on='instrument_name')
+    futures_price = pd.DataFrame({'instrumentName': futures['instrument_name'], 'expiryDate': get_date_strings(futures['expiration_timestamp']), 'Price': futures['last']})
+    return data_options, futures_price
+
+# dates (and time) of timestamps in ms as strings 'year-month-day' ('year-month-day hour:minute:second'), without leading zeros as in saved option chains
+def get_date_strings(timestamps, with_time=False):
+    dates = pd.Series([datetime.fromtimestamp(timestamp / 1000) for timestamp in timestamps], index=timestamps.index, dtype='datetime64[ns]')
+    date_strings = dates.dt.year.astype(str) + '-' + dates.dt.month.astype(str) + '-' + dates.dt.day.astype(str)
+    if with_time:
+        date_strings = date_strings + ' ' + dates.dt.hour.astype(str) + ':' + dates.dt.minute.astype(str) + ':' + dates.dt.second.astype(str)
+    return date_strings
+
+#----------------------------------------------------------------------------
+'''
+Streaming mode: quotes of all active options of currency are received from Derebit ticker channels over one WebSocket connection (url) and kept in table of latest quotes,
+every snapshot_interval seconds snapshot of this table is saved in the same format as get_data_about_crypto_options (spot is index price of quotes).
+Instruments are listed again every refresh_interval seconds: new options are subscribed, expired ones are unsubscribed and not saved; quotes older than max_quote_age seconds are not saved.
+Dropped connection is opened again with backoff. Function runs for duration seconds (forever if None).
+'''
+
+def stream_data_about_crypto_options(currency, url='wss://www.deribit.com/ws/api/v2', snapshot_interval=60, duration=None, client=None, interval='100ms', store=None, refresh_interval=600, max_quote_age=300):
+    client = client or DeribitClient()
+    instruments = {}
+
+    # active instruments by name (called in a thread of the stream)
+    def get_instrument_names():
+        nonlocal instruments
+        now = time.time() * 1000
+        instruments = {k['instrument_name']: k for k in client.get_instruments(currency, kind='option') if k['expiration_timestamp'] > now}
+        return list(instruments)
+
+    def on_snapshot(quotes):
+        now = time.time() * 1000
+        quoted_instruments = [k for name, k in instruments.items() if name in quotes and k['expiration_timestamp'] > now]
+        if not quoted_instruments:
+            return
+        order_books = [quotes[k['instrument_name']] for k in quoted_instruments]
+        spot_price = np.median([order_book['index_price'] for order_book in order_books])
+        save_crypto_options(get_crypto_options_table(currency, quoted_instruments, order_books, spot_price), currency, with_seconds=snapshot_interval < 60, store=store)
 
+    stream = DeribitStream(url, interval=interval, max_quote_age=max_quote_age)
+    asyncio.run(stream.run(get_instrument_names, on_snapshot, snapshot_interval, duration, refresh_interval))
+
+#----------------------------------------------------------------------------
+# make table of options in the format of saved option chain from instruments and corresponding order books (or tickers), prices in USD
+def get_crypto_options_table(currency, instruments, order_books, spot_price):
     #scrapping data about crypto options
-    for k in api_response['result']:
-        strike = k['strike']
-        option_type = k['option_type']
+    rows = []
+    for k, instuments_information in zip(instruments, order_books):
         time1 = datetime.fromtimestamp(k['expiration_timestamp'] / 1000)
         expiration =  str(time1.year) + '-' + str(time1.month) + '-' + str(time1.day)
         time1 = datetime.fromtimestamp(k['creation_timestamp'] / 1000)
         last_trade_day =  str(time1.year) + '-' + str(time1.month) + '-' + str(time1.day) + ' ' + str(time1.hour) + ':' + str(time1.minute) + ':' + str(time1.second)
-
-        instrument_name = k['instrument_name']
-        # scrapping data about given order book
-        instuments_information_url = 'https://deribit.com/api/v2/public/get_order_book?instrument_name=' + instrument_name
-        instuments_information = (requests.get(instuments_information_url)).json()
-        bid_price = instuments_information['result']['best_bid_price']
-        ask_price = instuments_information['result']['best_ask_price']
+        bid_price = instuments_information['best_bid_price']
+        ask_price = instuments_information['best_ask_price']
         mid_price = (ask_price + bid_price) / 2
-        volume = instuments_information['result']['stats']['volume']
-        open_interest = instuments_information['result']['open_interest']
-        DerebitIV = (instuments_information['result']['bid_iv'] + instuments_information['result']['ask_iv']) / 2
-        data_options = pd.concat([data_options, pd.DataFrame([instrument_name, last_trade_day, expiration, strike, option_type, spot_price, bid_price,ask_price, mid_price, volume, open_interest, DerebitIV]).T])
+        DerebitIV = (instuments_information['bid_iv'] + instuments_information['ask_iv']) / 2
+        rows.append([k['instrument_name'], last_trade_day, expiration, k['strike'], k['option_type'], spot_price, bid_price, ask_price, mid_price, instuments_information['stats']['volume'], instuments_information['open_interest'], DerebitIV, instuments_information['fetch_timestamp']])
     
     #making necessary adjustment
-    data_options.columns = ['instrumentName', 'lastTradeDate', 'expiryDate', 'strike','optionType','last close', 'bid', 'ask', 'mid', 'volume', 'openInterest', 'DerebitIV']
+    data_options = pd.DataFrame(rows, columns=['instrumentName', 'lastTradeDate', 'expiryDate', 'strike','optionType','last close', 'bid', 'ask', 'mid', 'volume', 'openInterest', 'DerebitIV', 'fetchTimestamp'])
     data_options['yFinance_dividend_yield'] = 0
-    data_options['optionType'].loc[data_options['optionType'] == 'call'] = 'calls'
-    data_options['optionType'].loc[data_options['optionType'] == 'put'] = 'puts'
+    data_options['optionType'] = data_options['optionType'].replace({'call': 'calls', 'put': 'puts'})
     data_options['ticker'] = currency
-    data_options['bid'] = data_options['bid'] * data_options['last close'].unique()[0]
-    data_options['ask'] = data_options['ask'] * data_options['last close'].unique()[0]
-    data_options['mid'] = data_options['mid'] * data_options['last close'].unique()[0]
+    data_options['bid'] = data_options['bid'] * spot_price
+    data_options['ask'] = data_options['ask'] * spot_price
+    data_options['mid'] = data_options['mid'] * spot_price
     data_options = data_options.loc[data_options['bid'] != 0]
     data_options = data_options.loc[data_options['ask'] != 0]
+    return data_options
 
-    data_options.to_csv('DATA//Crypto_currencies//' + currency + '//' + str(datetime.now().date()) + '-' + str(datetime.now().hour) + '-' + str(datetime.now().minute) + '.csv', index=False)
+# save option chain of currency in snapshot store (SnapshotStore) if it is given, otherwise in DATA folder, file name is current time (with seconds for snapshots more often than once a minute)
+# CSV file is registered in catalog (SnapshotCatalog) if it is given
+def save_crypto_options(data_options, currency, with_seconds=False, store=None, catalog=None):
+    now = datetime.now()
+    if store is not None:
+        store.write(data_options, currency, now)
+        return
+    filename = 'DATA//Crypto_currencies//' + currency + '//' + str(now.date()) + '-' + str(now.hour) + '-' + str(now.minute) + ('-' + str(now.second) if with_seconds else '') + '.csv'
+    data_options.to_csv(filename, index=False)
+    if catalog is not None:
+        catalog.register(filename, currency, now.replace(microsecond=0) if with_seconds else now.replace(second=0, microsecond=0), data_options)
 
-def get_funding_rate(currency):
+# annualized funding rate of perpetual of currency: mean hourly interest of the previous day * 24 * 365 (None without records)
+def get_funding_rate(currency, client=None):
+    client = client or DeribitClient()
     today = datetime.now().date()
     yesterday = today - timedelta(days=1)
     start_timestamp = int(mktime(datetime.strptime(str(yesterday), "%Y-%m-%d").timetuple())) * 1000
     end_timestamp = int(mktime(datetime.strptime(str(today), "%Y-%m-%d").timetuple())) * 1000
-    url = 'https://deribit.com/api/v2/public/get_funding_rate_history?instrument_name=' + currency + '-PERPETUAL&start_timestamp=' + str(start_timestamp) +'&end_timestamp=' + str(end_timestamp)
-    api_response = requests.get(url).json()
-
-    funding_rate = pd.DataFrame()
-    for k in api_response['result']:
-        time = datetime.fromtimestamp(k['timestamp'] / 1000)
-        Date = str(time.year) + '-' + str(time.month) + '-' + str(time.day)
-        rate = k['interest_1h']
-    funding_rate = pd.concat([funding_rate, pd.DataFrame([Date,rate]).T])
-    funding_rate.columns = ['Date', 'rate']
-    funding_rate = funding_rate.set_index('Date')
-    rate = funding_rate.mean() * 365
-    
-    return rate[0]
\ No newline at end of file
+    funding_rate = pd.DataFrame(client.get_funding_rate_history(currency + '-PERPETUAL', start_timestamp, end_timestamp), columns=['timestamp', 'interest_1h'])
+    if funding_rate.empty:
+        return None
+    return float(funding_rate['interest_1h'].astype(float).mean() * 24 * 365)
\ No newline at end of file
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import websockets
+from requests.adapters import HTTPAdapter
+
+#----------------------------------------------------------------------------
+'''
+Token bucket rate limiter shared by threads: bucket of capacity tokens is refilled with rate tokens per second, every request takes one token (waits if bucket is empty).
+'''
+class TokenBucket:
+    def __init__(self, rate=20.0, capacity=50):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+#----------------------------------------------------------------------------
+'''
+Client for public API of Derebit exchange (JSON-RPC over HTTP GET).
+One keep-alive session with connection pool of max_workers connections, order books are fetched concurrently by max_workers threads.
+Every request goes through token bucket (rate requests per second, burst of capacity requests, Derebit limits for public methods)
+and is retried up to max_retries times with exponential backoff (with jitter) on connection errors, HTTP 429/5xx and "too many requests" errors.
+base_url (and history_url for instruments) can point to local server which serves recorded JSON.
+'''
+class DeribitClient:
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    TOO_MANY_REQUESTS = 10028 # Derebit error code
+
+    def __init__(self, base_url='https://deribit.com/api/v2', history_url='https://history.deribit.com/api/v2', max_workers=10, rate=20.0, capacity=50, max_retries=5, backoff=0.5, max_backoff=10.0, timeout=10.0):
+        self.base_url = base_url.rstrip('/')
+        self.history_url = history_url.rstrip('/') if history_url is not None else self.base_url
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket(rate, capacity)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # call public method, returns 'result' of response
+    def get(self, method, base_url=None, **params):
+        url = (base_url or self.base_url) + '/public/' + method
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code not in self.RETRY_STATUS:
+                    response.raise_for_status()
+                    api_response = response.json()
+                    if 'error' not in api_response:
+                        return api_response['result']
+                    if api_response['error'].get('code') != self.TOO_MANY_REQUESTS:
+                        raise RuntimeError('Derebit error in ' + method + ': ' + str(api_response['error']))
+                error = 'HTTP ' + str(response.status_code) if response.status_code in self.RETRY_STATUS else 'too many requests'
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+            if attempt < self.max_retries:
+                time.sleep(min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0))
+        raise RuntimeError('Derebit request ' + method + ' failed after ' + str(self.max_retries + 1) + ' attempts: ' + str(error))
+
+    def get_instruments(self, currency, kind='option', expired=False):
+        return self.get('get_instruments', base_url=self.history_url, currency=currency, kind=kind, expired=str(expired).lower())
+
+    def get_index(self, currency):
+        return self.get('get_index', currency=currency)
+
+    def get_funding_rate_history(self, instrument_name, start_timestamp, end_timestamp):
+        return self.get('get_funding_rate_history', instrument_name=instrument_name, start_timestamp=start_timestamp, end_timestamp=end_timestamp)
+
+    def get_order_book(self, instrument_name):
+        order_book = self.get('get_order_book', instrument_name=instrument_name)
+        order_book['fetch_timestamp'] = int(time.time() * 1000) # fetch time in ms, as Derebit timestamps
+        return order_book
+
+    # summary of order books of all instruments of given kind in one request
+    def get_book_summary_by_currency(self, currency, kind='option'):
+        book_summary = self.get('get_book_summary_by_currency', currency=currency, kind=kind)
+        fetch_timestamp = int(time.time() * 1000)
+        for summary in book_summary:
+            summary['fetch_timestamp'] = fetch_timestamp
+        return book_summary
+
+    # order books of all instruments (in the same order), fetched concurrently
+    def get_order_books(self, instrument_names):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self.get_order_book, instrument_names))
+
+#----------------------------------------------------------------------------
+'''
+Cache of active instruments of client by currency and kind, shared across collection cycles (lists change only when new instruments are listed or old ones expire).
+List is requested again when it is older than ttl seconds, when one of required names (instruments quoted in book summary) is not in the list, or after an instrument of the list has expired.
+'''
+class InstrumentCache:
+    def __init__(self, client, ttl=3600.0):
+        self.client = client
+        self.ttl = ttl
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, currency, kind='option', names=()):
+        key = (currency, kind)
+        with self.lock:
+            cached = self.data.get(key)
+        now = time.time()
+        if cached is not None and now - cached[0] < self.ttl and now * 1000 < cached[2] and set(names) <= cached[1].keys():
+            return list(cached[1].values())
+        instruments = self.client.get_instruments(currency, kind=kind)
+        first_expiration = min((k['expiration_timestamp'] for k in instruments), default=float('inf'))
+        with self.lock:
+            self.data[key] = (now, {k['instrument_name']: k for k in instruments}, first_expiration)
+        return instruments
+
+#----------------------------------------------------------------------------
+'''
+Streaming client for Derebit WebSocket API: subscribes to ticker channels (ticker.<instrument>.<interval>) of given instruments over one connection
+and keeps table of latest quotes (ticker data with receive time fetch_timestamp, ms) by instrument name.
+Every snapshot_interval seconds (aligned to start, without drift) on_snapshot is called with a copy of the table; heartbeats of the server are answered.
+instruments is a list of names or a function returning current names; the function is called again every refresh_interval seconds and
+channels of new instruments are subscribed, channels of removed (expired) ones are unsubscribed and their quotes are dropped.
+Quotes older than max_quote_age seconds are dropped from the table. Dropped connection is opened again with exponential backoff (with jitter), quotes keep their age meanwhile.
+url can point to local server.
+'''
+class DeribitStream:
+    def __init__(self, url='wss://www.deribit.com/ws/api/v2', interval='100ms', batch_size=200, heartbeat=30, max_quote_age=None, backoff=0.5, max_backoff=30.0):
+        self.url = url
+        self.interval = interval
+        self.batch_size = batch_size
+        self.heartbeat = heartbeat
+        self.max_quote_age = max_quote_age
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.quotes = {}
+        self.instrument_names = set()
+        self.ws = None
+        self.request_id = 0
+
+    async def send(self, ws, method, **params):
+        self.request_id += 1
+        await ws.send(json.dumps({'jsonrpc': '2.0', 'id': self.request_id, 'method': method, 'params': params}))
+
+    async def subscribe(self, ws, instrument_names, method='public/subscribe'):
+        channels = ['ticker.' + name + '.' + self.interval for name in instrument_names]
+        for i in range(0, len(channels), self.batch_size):
+            await self.send(ws, method, channels=channels[i:i + self.batch_size])
+
+    async def read(self, ws):
+        async for message in ws:
+            data = json.loads(message)
+            if data.get('method') == 'subscription':
+                quote = dict(data['params']['data'])
+                if quote['instrument_name'] not in self.instrument_names: # late message of unsubscribed channel
+                    continue
+                quote['fetch_timestamp'] = int(time.time() * 1000)
+                self.quotes[quote['instrument_name']] = quote
+            elif data.get('method') == 'heartbeat' and data['params'].get('type') == 'test_request':
+                await self.send(ws, 'public/test')
+
+    def snapshot(self):
+        if self.max_quote_age is not None:
+            oldest = int((time.time() - self.max_quote_age) * 1000)
+            for name in [name for name, quote in self.quotes.items() if quote['fetch_timestamp'] < oldest]:
+                del self.quotes[name]
+        return {name: dict(quote) for name, quote in self.quotes.items()}
+
+    # subscribe new instruments and unsubscribe removed ones (on open connection), drop quotes of removed instruments
+    async def update_instruments(self, instrument_names):
+        instrument_names = set(instrument_names)
+        added, removed = instrument_names - self.instrument_names, self.instrument_names - instrument_names
+        self.instrument_names = instrument_names
+        for name in removed:
+            self.quotes.pop(name, None)
+        if self.ws is not None:
+            if removed:
+                await self.subscribe(self.ws, sorted(removed), 'public/unsubscribe')
+            if added:
+                await self.subscribe(self.ws, sorted(added))
+
+    # keep connection open: connect, subscribe all instruments, read; reconnect with backoff when connection is dropped
+    async def connect(self):
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(self.url, max_size=None) as ws:
+                    self.ws = ws
+                    if self.heartbeat:
+                        await self.send(ws, 'public/set_heartbeat', interval=self.heartbeat)
+                    await self.subscribe(ws, sorted(self.instrument_names))
+                    attempt = 0
+                    await self.read(ws)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+                pass
+            finally:
+                self.ws = None
+            await asyncio.sleep(min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0))
+            attempt += 1
+
+    async def run(self, instruments, on_snapshot, snapshot_interval=60, duration=None, refresh_interval=None):
+        get_instrument_names = instruments if callable(instruments) else lambda: instruments
+        await self.update_instruments(await asyncio.to_thread(get_instrument_names))
+        connection = asyncio.create_task(self.connect())
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        next_snapshot = start + snapshot_interval
+        next_refresh = start + refresh_interval if refresh_interval else float('inf')
+        try:
+            while duration is None or next_snapshot <= start + duration:
+                await asyncio.sleep(max(0, min(next_snapshot, next_refresh) - loop.time()))
+                if connection.done():
+                    connection.result() # unexpected error of connection: raise it
+                if loop.time() >= next_refresh:
+                    try:
+                        await self.update_instruments(await asyncio.to_thread(get_instrument_names))
+                    except (RuntimeError, requests.RequestException):
+                        pass # keep current instruments until the next refresh
+                    next_refresh += refresh_interval
+                if loop.time() >= next_snapshot:
+                    on_snapshot(self.snapshot())
+                    next_snapshot += snapshot_interval
+        finally:
+            connection.cancel()
+            try:
+                await connection
+            except asyncio.CancelledError:
+                pass
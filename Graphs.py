@@ -9,7 +9,7 @@ def scatter_3D(ticker, data_dict):
     ax = plt.axes(projection ="3d")
 
     for k in data_dict["implied_volatility_surface"]:
-        ax.scatter( k['expiry_date_in_act365_year_fraction'], np.array(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], s=10)
+        ax.scatter( k['expiry_date_in_act365_year_fraction'], np.asarray(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], s=10)
 
     ax.set_title(ticker)
     ax.set_xlabel(r'Maturity (year fraction)')
@@ -24,8 +24,8 @@ def lines_3D(ticker, data_dict):
     ax = plt.axes(projection ="3d")
 
     for k in data_dict["implied_volatility_surface"]:
-        ax.plot(np.array(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], zs=k['expiry_date_in_act365_year_fraction'],zdir='x')
-        ax.scatter( k['expiry_date_in_act365_year_fraction'], np.array(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], s=10)
+        ax.plot(np.asarray(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], zs=k['expiry_date_in_act365_year_fraction'],zdir='x')
+        ax.scatter( k['expiry_date_in_act365_year_fraction'], np.asarray(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], s=10)
 
     ax.set_title(ticker)
     ax.set_xlabel(r'Maturity (year fraction)')
@@ -44,12 +44,12 @@ def lines_3D_SVI_raw(ticker, data_dict, low_limit, high_limit, N, with_IV_from_B
     ax = plt.axes(projection ="3d")
     if with_IV_from_BlackModel:
         for k in data_dict["implied_volatility_surface"]:
-            x_grid = np.array(k['strikes'])/k['reference_forward']
+            x_grid = np.asarray(k['strikes'])/k['reference_forward']
             ax.plot(x_grid, k['SVI_implied_volatilities'], zs=k['expiry_date_in_act365_year_fraction'],zdir='x', color='r')
-            ax.plot(np.array(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], zs=k['expiry_date_in_act365_year_fraction'],zdir='x', color ='b')
+            ax.plot(np.asarray(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], zs=k['expiry_date_in_act365_year_fraction'],zdir='x', color ='b')
     else:    
         for k in data_dict["implied_volatility_surface"]:
-            x_grid = np.array(k['strikes'])/k['reference_forward']
+            x_grid = np.asarray(k['strikes'])/k['reference_forward']
             ax.plot(x_grid, k['SVI_implied_volatilities'], zs=k['expiry_date_in_act365_year_fraction'],zdir='x')
 
     ax.set_title(ticker)
@@ -68,9 +68,9 @@ def lines_2D_SVI_raw(ticker, data_dict, expire_date, low_limit, high_limit, N, w
     plt.figure(figsize = (8,3))
     ax = plt.gca()
     k = data_dict["implied_volatility_surface"][expire_date]
-    x_grid = np.array(k['strikes'])/k['reference_forward']
+    x_grid = np.asarray(k['strikes'])/k['reference_forward']
     ax.plot(x_grid, k['SVI_implied_volatilities'], label = 'IV from SVI', color='r')
-    ax.plot(np.array(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], label= 'IV from Black model', color ='b')
+    ax.plot(np.asarray(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], label= 'IV from Black model', color ='b')
     ax.set_title(ticker + '  ' + k['expiry_date'])
     ax.set_xlabel(r'strike (fwd moneyness)')
     ax.set_ylabel(r'Implied Volatility')
@@ -83,8 +83,8 @@ def lines_2D(ticker, data_dict):
     ax = plt.gca()
 
     for k in data_dict["implied_volatility_surface"]:
-        ax.scatter(np.array(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], label= k['expiry_date'], s=10)
-        plt.plot(np.array(k['strikes'])/k['reference_forward'],k['mid_implied_volatilities'])
+        ax.scatter(np.asarray(k['strikes'])/k['reference_forward'], k['mid_implied_volatilities'], label= k['expiry_date'], s=10)
+        plt.plot(np.asarray(k['strikes'])/k['reference_forward'],k['mid_implied_volatilities'])
 
     ax.set_title(ticker)
     ax.set_xlabel(r'strike (fwd moneyness)')
@@ -189,7 +189,7 @@ def lines_2D_SVI(ticker, data_dict, expiry_date):
     ax2 = fig.add_subplot(122)
 
     k = data_dict["implied_volatility_surface"][expiry_date]
-    grid = np.array(k['strikes'])/k['reference_forward']
+    grid = np.asarray(k['strikes'])/k['reference_forward']
     ax1.scatter(grid, k['mid_implied_volatilities'], s = 5, color='y')
     ax1.plot(grid, k['mid_implied_volatilities'], label= 'mid IV from BM', color='y', linewidth=0.7)
     
@@ -247,13 +247,13 @@ def lines_2D_total_varience(ticker, data_dict, end_number, interpolation=False):
     else:
         for j in range(0, len(data_dict["implied_volatility_surface"]) - end_number):
             k = data_dict["implied_volatility_surface"][j]
-            ax1.scatter(np.array(k['strikes'])/k['reference_forward'], k['w_SVI_total_variance'], label= k['expiry_date'], s=10)
-            ax1.plot(np.array(k['strikes'])/k['reference_forward'],k['w_SVI_total_variance'])
+            ax1.scatter(np.asarray(k['strikes'])/k['reference_forward'], k['w_SVI_total_variance'], label= k['expiry_date'], s=10)
+            ax1.plot(np.asarray(k['strikes'])/k['reference_forward'],k['w_SVI_total_variance'])
         
         for j in range(len(data_dict["implied_volatility_surface"]) - end_number, len(data_dict["implied_volatility_surface"])):
             k = data_dict["implied_volatility_surface"][j]
-            ax2.scatter(np.array(k['strikes'])/k['reference_forward'], k['w_SVI_total_variance'], label= k['expiry_date'], s=10)
-            ax2.plot(np.array(k['strikes'])/k['reference_forward'],k['w_SVI_total_variance'])
+            ax2.scatter(np.asarray(k['strikes'])/k['reference_forward'], k['w_SVI_total_variance'], label= k['expiry_date'], s=10)
+            ax2.plot(np.asarray(k['strikes'])/k['reference_forward'],k['w_SVI_total_variance'])
 
     ax1.set_title(ticker + ' total variance')
     ax2.set_title(ticker + ' total variance')
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from numpy.typing import NDArray
+
+FloatArray = NDArray[np.float64]
+
+
+@dataclass
+class DiscountCurve:
+    """Discount curve built from instantaneous rates.
+    The integral of the rate is precomputed on the curve nodes, so discount
+    factors for any set of maturities are obtained by one interpolation
+      `DF(T) = exp(-integral from 0 to T of r(t) dt)`.
+    Beyond the last node the last rate is extrapolated flat.
+    Attributes:
+      times: Nodes of the curve in ACT/365 year fractions from data date.
+      cumulative_integral: Integral of the rate from 0 to each node.
+      last_rate: Rate used for extrapolation beyond the last node.
+    Methods:
+      from_SOFR: Builds the curve from `DATA/discount_curve.csv` data.
+      discount_factor: Discount factors for array of year fractions.
+    """
+    times: FloatArray
+    cumulative_integral: FloatArray
+    last_rate: float
+
+    @classmethod
+    def from_SOFR(cls, discount_curve: pd.DataFrame, data_date: datetime,
+                  column: str = '3 Month Term SOFR Forward Curve'):
+        """Builds the curve from SOFR forward curve.
+        Rates are treated as instantaneous rates with ACT/360 accrual and
+        integrated by the trapezoidal rule, the first rate is extrapolated
+        flat back to the data date.
+        Args:
+          discount_curve: Dataframe with `Date` column and rates in decimals.
+          data_date: Valuation date.
+          column: Column of the rates.
+        Returns:
+          Instance of the class.
+        """
+        days = ((pd.to_datetime(discount_curve['Date']) - pd.Timestamp(data_date)).dt.days).to_numpy(dtype=float)
+        rates = discount_curve[column].to_numpy(dtype=float)
+        order = np.argsort(days)
+        days, rates = days[order], rates[order]
+        keep = days > 0
+        days = np.concatenate(([0.0], days[keep]))
+        rates = np.concatenate(([rates[keep][0] if keep.any() else rates[-1]], rates[keep]))
+        cumulative_integral = np.concatenate(([0.0], np.cumsum((rates[1:] + rates[:-1]) / 2 * np.diff(days) / 360)))
+        return cls(days / 365, cumulative_integral, float(rates[-1]) * 365 / 360)
+
+    @classmethod
+    def flat(cls, rate: float = 0.0):
+        """Curve with constant continuously compounded rate (ACT/365)."""
+        return cls(np.array([0.0]), np.array([0.0]), rate)
+
+    def discount_factor(self, T):
+        """Discount factors for (array of) ACT/365 year fractions `T`."""
+        T = np.asarray(T, dtype=float)
+        integral = np.interp(T, self.times, self.cumulative_integral)
+        integral = integral + np.maximum(T - self.times[-1], 0.0) * self.last_rate
+        return np.exp(-integral)
+
+
+@dataclass
+class ForwardCurve:
+    """Forward curve of the underlying.
+    The curve keeps cumulative integral of the carry `log(F(T)/S)` on the
+    nodes (spot at T=0 and futures maturities), which is linearly
+    interpolated, i.e. carry is piecewise constant between futures.
+    Beyond the last future the funding rate (if given) or the last carry is
+    extrapolated. Without futures of positive maturity the curve is flat
+    at spot (with the funding rate as carry, if given).
+    Attributes:
+      times: Nodes in ACT/365 year fractions, starting from 0.
+      log_forwards: Logarithms of forwards on the nodes.
+      last_rate: Carry used for extrapolation beyond the last node.
+    Methods:
+      from_futures: Builds the curve from futures term structure.
+      forward: Forwards for array of year fractions.
+    """
+    times: FloatArray
+    log_forwards: FloatArray
+    last_rate: float
+
+    @classmethod
+    def from_futures(cls, T, futures_price, spot: float = None, funding_rate: float = None):
+        """Builds the curve from futures term structure.
+        Args:
+          T: Maturities of futures in ACT/365 year fractions.
+          futures_price: Prices of futures.
+          spot: Spot price, if not given the nearest future is used as spot.
+          funding_rate: Annualized perpetual funding rate used for
+            extrapolation beyond the last future.
+        Returns:
+          Instance of the class.
+        Raises:
+          ValueError: If there is neither a future of positive maturity nor
+            the spot.
+        """
+        T = np.asarray(T, dtype=float)
+        futures_price = np.asarray(futures_price, dtype=float)
+        order = np.argsort(T)
+        T, futures_price = T[order], futures_price[order]
+        keep = T > 0
+        T, futures_price = T[keep], futures_price[keep]
+        if spot is None:
+            if len(futures_price) == 0:
+                raise ValueError("Forward curve needs a future of positive maturity or the spot")
+            spot = futures_price[0]
+        times = np.concatenate(([0.0], T))
+        log_forwards = np.log(np.concatenate(([spot], futures_price)))
+        if funding_rate is None:
+            funding_rate = (log_forwards[-1] - log_forwards[-2]) / (times[-1] - times[-2]) if len(times) > 1 else 0.0
+        return cls(times, log_forwards, float(funding_rate))
+
+    def forward(self, T):
+        """Forwards for (array of) ACT/365 year fractions `T`."""
+        T = np.asarray(T, dtype=float)
+        log_forward = np.interp(T, self.times, self.log_forwards)
+        log_forward = log_forward + np.maximum(T - self.times[-1], 0.0) * self.last_rate
+        return np.exp(log_forward)
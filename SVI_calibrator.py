@@ -1,8 +1,9 @@
 from typing import Optional
+import time
 from dataclasses import dataclass
 import numpy as np
 from scipy import optimize  # type: ignore
-from typing import Union
+from typing import Union, Sequence, Tuple
 from numpy import float_
 from numpy.typing import NDArray
 
@@ -24,6 +25,7 @@ class SVI:
       a, b, rho, m, sigma: Model parameters.
     Methods:
       calibrate: Calibrates parameters of the model.
+      fit_parabola: Deterministic fallback fit.
     """
     a: float
     b: float
@@ -31,14 +33,111 @@ class SVI:
     m: float
     sigma: float
 
+    # Constraints `G @ (a, d, c) <= h` of the inner problem:
+    #   |d| <= c <= 4*sigma - |d| (four edges of the (d, c) diamond), a <= max(w);
+    # the right-hand sides are (0, 0, 4*sigma, 4*sigma, max(w)).
+    _CONSTRAINTS = np.array([[0., 1., -1.],
+                             [0., -1., -1.],
+                             [0., 1., 1.],
+                             [0., -1., 1.],
+                             [1., 0., 0.]])
+    # Candidate active sets for the exact solver; sets containing parallel
+    # edges of the diamond (0 and 3, 1 and 2) are empty or degenerate.
+    _ACTIVE_SETS = [(0,), (1,), (2,), (3,), (4,),
+                    (0, 1), (0, 2), (1, 3), (2, 3),
+                    (0, 4), (1, 4), (2, 4), (3, 4),
+                    (0, 1, 4), (0, 2, 4), (1, 3, 4), (2, 3, 4)]
+
     @staticmethod
-    def _calibrate_adc(x: FloatArray, w: FloatArray, m: float,
-                       sigma: float) -> float:
+    def _solve_equality_constrained(H: FloatArray, g: FloatArray,
+                                    G: FloatArray, h: FloatArray):
+        """Minimizes `0.5*p@H@p - g@p` subject to `G@p = h` for a batch.
+        Args:
+          H: Array of shape (n, 3, 3).
+          g: Array of shape (n, 3).
+          G: Array of shape (k, 3) (the same for the whole batch).
+          h: Array of shape (n, k).
+        Returns:
+          Tuple `(p, f)` of minimizers of shape (n, 3) and values of
+          `0.5*p@H@p - g@p` of shape (n,).
+        """
+        n, k = len(H), len(G)
+        M = np.zeros((n, 3+k, 3+k))
+        M[:, :3, :3] = H
+        M[:, :3, 3:] = G.T
+        M[:, 3:, :3] = G
+        rhs = np.concatenate((g, h), axis=1)[..., None]
+        try:
+            p = np.linalg.solve(M, rhs)[:, :3, 0]
+        except np.linalg.LinAlgError:
+            p = (np.linalg.pinv(M) @ rhs)[:, :3, 0]
+        f = 0.5*np.einsum('ni,nij,nj->n', p, H, p) - np.einsum('ni,ni->n', g, p)
+        return p, f
+
+    @classmethod
+    def _calibrate_adc_batch(cls, x: FloatArray, w: FloatArray, m: Floats,
+                             sigma: Floats):
+        """Calibrates the raw parameters `a, d, c` for a batch of `m, sigma`.
+        The inner problem is a linear least-squares problem in `a, d, c` over
+        a small polytope, so it is solved exactly (quasi-explicit method of
+        Zeliade Systems): the normal equations are solved without constraints
+        and, where this solution is infeasible, for every candidate set of
+        active constraints; the best feasible candidate is the minimum.
+        Args:
+          x: Array of log-moneynesses.
+          w: Array of total implied variances.
+          m: Parameters `m` (array of any shape).
+          sigma: Parameters `sigma` (broadcastable with `m`).
+        Returns:
+          Tuple `(p, f)` where `p` is array of shape `m.shape + (3,)` of the
+          calibrated `a, d, c` and `f` is array of the values of the objective
+          function at the minimum.
+        """
+        x, w = np.asarray(x, dtype=float), np.asarray(w, dtype=float)
+        m, sigma = np.broadcast_arrays(np.asarray(m, dtype=float),
+                                       np.asarray(sigma, dtype=float))
+        shape = m.shape
+        m, sigma = m.reshape(-1, 1), sigma.reshape(-1, 1)
+        size, n = len(m), len(x)
+        y = (x-m)/sigma
+        z = np.sqrt(y**2+1)
+        # Normal equations H @ p = g for p = (a, d, c)
+        sy, sz, syz, syy = y.sum(1), z.sum(1), (y*z).sum(1), (y*y).sum(1)
+        H = np.stack((np.stack((np.full(size, n), sy, sz), axis=1),
+                      np.stack((sy, syy, syz), axis=1),
+                      np.stack((sz, syz, syy+n), axis=1)), axis=1)
+        g = np.stack((np.full(size, w.sum()), y@w, z@w), axis=1)
+        h = np.concatenate((np.zeros((size, 2)), 4*sigma, 4*sigma,
+                            np.full((size, 1), np.max(w))), axis=1)
+        tol = 1e-12*np.maximum(1, np.abs(h))
+
+        p, f = cls._solve_equality_constrained(H, g, np.empty((0, 3)),
+                                               np.empty((size, 0)))
+        todo = np.flatnonzero(np.any(p@cls._CONSTRAINTS.T > h+tol, axis=1))
+        if len(todo):
+            H, g, h, tol = H[todo], g[todo], h[todo], tol[todo]
+            best_p = np.zeros((len(todo), 3))
+            best_f = np.full(len(todo), np.inf)
+            for active in cls._ACTIVE_SETS:
+                active = list(active)
+                q, fq = cls._solve_equality_constrained(
+                    H, g, cls._CONSTRAINTS[active], h[:, active])
+                better = np.all(q@cls._CONSTRAINTS.T <= h+tol, axis=1) & \
+                    (fq < best_f)
+                best_p[better], best_f[better] = q[better], fq[better]
+            p[todo], f[todo] = best_p, best_f
+        f = np.maximum(f + 0.5*np.dot(w, w), 0)
+        return p.reshape(shape+(3,)), f.reshape(shape)
+
+    @classmethod
+    def _calibrate_adc(cls, x: FloatArray, w: FloatArray, m: float,
+                       sigma: float):
         """Calibrates the raw parameters `a, d, c` given `m, sigma`.
         This is an auxiliary function used in the two-step calibration
         procedure. It finds `a, d, c` which minimize the sum of squares of the
         differences of the given total implied variances and the ones produced
-        by the model, assuming that `m, sigma` are given and fixed.
+        by the model, assuming that `m, sigma` are given and fixed. The problem
+        is solved exactly by `_calibrate_adc_batch`.
         Args:
           x: Array of log-moneynesses
           w: Array of total implied variances.
@@ -48,39 +147,66 @@ class SVI:
           Tuple `((a, d, c), f)` where `a, d, c` are the calibrated parameters
           and `f` is the value of the objective function at the minimum.
         """
-        # Objective function; p = (a, d, c)
-        def f(p):
-            return 0.5*np.linalg.norm(
-                p[0] + p[1]*(x-m)/sigma + p[2]*np.sqrt(((x-m)/sigma)**2+1) -
-                w)**2
-
-        # Gradient of the objective function
-        def fprime(p):
-            v1 = (x-m)/sigma
-            v2 = np.sqrt(((x-m)/sigma)**2+1)
-            v = p[0] + p[1]*v1 + p[2]*v2 - w
-            return (np.sum(v), np.dot(v1, v), np.dot(v2, v))
-
-        res = optimize.minimize(
-            f,
-            x0=(np.max(w)/2, 0, 2*sigma),
-            method="SLSQP",
-            jac=fprime,
-            bounds=[(None, np.max(w)), (None, None), (0, 4*sigma)],
-            constraints=[
-                {'type': 'ineq',
-                 'fun': lambda p: p[2]-p[1],
-                 'jac': lambda _: (0, -1, 1)},
-                {'type': 'ineq',
-                 'fun': lambda p: p[2]+p[1],
-                 'jac': lambda _: (0, 1, 1)},
-                {'type': 'ineq',
-                 'fun': lambda p: 4*sigma - p[2]-p[1],
-                 'jac': lambda _: (0, -1, -1)},
-                {'type': 'ineq',
-                 'fun': lambda p: p[1]+4*sigma-p[2],
-                 'jac': lambda _: (0, 1, -1)}])
-        return res.x, res.fun
+        p, f = cls._calibrate_adc_batch(x, w, m, sigma)
+        return p, float(f)
+
+    @classmethod
+    def _grid_search(cls, objective: "_CalibrationBudget",
+                     bounds: Sequence[Tuple[float, float]], grid_size: int,
+                     n_refine: int, seed: Optional[int],
+                     x0: Optional[Tuple[float, float]] = None):
+        """Deterministic outer search for `m, sigma`.
+        The reduced objective (the inner problem solved exactly) is evaluated
+        on a `grid_size x grid_size` grid (uniform in `m`, logarithmic in
+        `sigma`) in one batched call; the `n_refine` best grid points are then
+        refined by bounded Nelder-Mead and the best result is returned. If
+        `seed` is given, the grid points are shifted randomly inside their
+        cells, the shifts depend only on `seed` and `grid_size`. If `x0` is
+        given, it is refined as well (warm start).
+        Returns:
+          `scipy.optimize.OptimizeResult` with `x = (m, sigma)`.
+        """
+        (min_m, max_m), (min_sigma, max_sigma) = bounds
+        u = (np.arange(grid_size)+0.5)/grid_size
+        v = (np.arange(grid_size)+0.5)/grid_size
+        if seed is not None:
+            rng = np.random.default_rng(seed)
+            u = u + rng.uniform(-0.5, 0.5, grid_size)/grid_size
+            v = v + rng.uniform(-0.5, 0.5, grid_size)/grid_size
+        m_grid = min_m + (max_m-min_m)*u
+        sigma_grid = min_sigma*(max_sigma/min_sigma)**v
+        f_grid = objective.batch(m_grid[:, None], sigma_grid[None, :])
+
+        starts = [(m_grid[i], sigma_grid[j]) for i, j in zip(*np.unravel_index(
+            np.argsort(f_grid, axis=None)[:n_refine], f_grid.shape))]
+        if x0 is not None:
+            starts.append(x0)
+        best = None
+        for start in starts:
+            res = optimize.minimize(objective, x0=start, method="nelder-mead",
+                                    bounds=bounds)
+            if best is None or res.fun < best.fun:
+                best = res
+        return best
+
+    @classmethod
+    def _outer_search(cls, objective: "_CalibrationBudget",
+                      bounds: Sequence[Tuple[float, float]], method: str,
+                      seed: Optional[int], x0: Optional[Tuple[float, float]],
+                      maxiter: int, grid_size: int, n_refine: int):
+        """Outer step for `m, sigma` within `bounds` (see `calibrate`)."""
+        if method == "dual_annealing":
+            return optimize.dual_annealing(
+                objective,  # q=(m, sigma)
+                bounds=bounds,
+                minimizer_kwargs={"method": "nelder-mead"},
+                seed=seed,
+                x0=x0,
+                maxiter=maxiter)
+        if method == "grid":
+            return cls._grid_search(objective, bounds, grid_size, n_refine,
+                                    seed, x0)
+        raise ValueError("Unknown calibration method: " + str(method))
 
     @classmethod
     def calibrate(cls,
@@ -88,32 +214,91 @@ class SVI:
                   w: FloatArray,
                   min_sigma: float = 1e-4,
                   max_sigma: float = 10,
-                  return_minimize_result: bool = False):
+                  return_minimize_result: bool = False,
+                  method: str = "dual_annealing",
+                  grid_size: int = 30,
+                  n_refine: int = 3,
+                  seed: Optional[int] = None,
+                  initial_param: Optional["SVI"] = None,
+                  warm_start_width: float = 0.1,
+                  warm_start_factor: float = 2,
+                  warm_start_maxiter: int = 100,
+                  maxfev: Optional[int] = None,
+                  time_limit: Optional[float] = None,
+                  w_bid: Optional[FloatArray] = None,
+                  w_ask: Optional[FloatArray] = None):
         """Calibrates the parameters of the model.
         This function finds the parameters which minimize the sum of squares of
         the differences of the given total implied variances and the ones
         produced by the model.
         The two-step minimization procedure is used (by Zeliade Systems, see
         their white paper). For each pair of parameters `sigma, m`, parameters
-        `a, d, c` are found by using a gradient method; then `sigma, m` are
-        found by a stochastic method (namely, SLSQP and Dual Annealing are
-        used).
+        `a, d, c` are found exactly (normal equations and enumeration of the
+        active constraints); then `sigma, m` are found either by a stochastic
+        method (Dual Annealing) or by a deterministic grid search with local
+        refinement (see `_grid_search`).
+        If `initial_param` (e.g. the result of the previous calibration) is
+        given, the search starts from its `m, sigma` within narrowed bounds:
+        `m` within `warm_start_width` of the range of `x` and `sigma` within
+        the factor `warm_start_factor`. If the warm start result lies on a
+        narrowed bound, or (with `w_bid, w_ask`) the model is not within the
+        bid-ask spread, the search is repeated within the full bounds.
         Args:
           x: Array of log-moneynesses
           w: Array of total implied variances.
           min_sigma, max_sigma: Bounds for `sigma` parameter.
           return_minimize_result: If True, return also the minimization result
-            of `sciy.optimize.dual_annealing`.
+            of the outer step.
+          method: Outer step, "dual_annealing" or "grid".
+          grid_size: Number of grid points for each of `m, sigma` ("grid").
+          n_refine: Number of best grid points refined locally ("grid").
+          seed: Random seed, makes the result reproducible.
+          initial_param: Parameters to start from (warm start).
+          warm_start_width, warm_start_factor: Narrowing of the bounds of
+            `m, sigma` around `initial_param`.
+          warm_start_maxiter: Number of global iterations of Dual Annealing
+            within the narrowed bounds (1000 without warm start).
+          maxfev, time_limit: Budget of the outer step (number of evaluations
+            of the reduced objective and seconds); when it is spent, the best
+            point found so far is used.
+          w_bid, w_ask: Total variances of bid and ask; if given, the outer
+            step stops as soon as the model lies within them for all quotes.
         Returns:
           If `return_minimize_result` is True, returns a tuple `(cls, res)`,
           where `cls` is an instance of the class with the calibrated
           parameters and `res` in the optimization result returned by
-          `scipy.optimize.dual_annealing`. Otherwise returns only `cls`.
+          the outer step (`res.stop_reason` is "converged", "maxfev",
+          "time_limit" or "within_bid_ask"). Otherwise returns only `cls`.
         """
-        res = optimize.dual_annealing(
-            lambda q: cls._calibrate_adc(x, w, q[0], q[1])[1],  # q=(m, sigma)
-            bounds=[(min(x), max(x)), (min_sigma, max_sigma)],
-            minimizer_kwargs={"method": "nelder-mead"})
+        full_bounds = [(min(x), max(x)), (min_sigma, max_sigma)]
+        bounds = full_bounds
+        x0 = None
+        if initial_param is not None:
+            m0 = min(max(initial_param.m, min(x)), max(x))
+            sigma0 = min(max(initial_param.sigma, min_sigma), max_sigma)
+            width = warm_start_width*(max(x)-min(x))
+            bounds = [(max(m0-width, min(x)), min(m0+width, max(x))),
+                      (max(sigma0/warm_start_factor, min_sigma),
+                       min(sigma0*warm_start_factor, max_sigma))]
+            x0 = (m0, sigma0)
+        objective = _CalibrationBudget(x, w, maxfev, time_limit, w_bid, w_ask)
+        try:
+            res = cls._outer_search(objective, bounds, method, seed, x0,
+                                    1000 if x0 is None else warm_start_maxiter,
+                                    grid_size, n_refine)
+            if x0 is not None and _needs_full_bounds(res.x, bounds, full_bounds,
+                                                     w_bid, w_ask):
+                full_res = cls._outer_search(objective, full_bounds, method,
+                                             seed, x0, 1000, grid_size,
+                                             n_refine)
+                if full_res.fun < res.fun:
+                    res = full_res
+            res.stop_reason = "converged"
+        except _StopCalibration as stop:
+            res = optimize.OptimizeResult(
+                x=np.array(objective.best_q), fun=objective.best_f,
+                success=True, message=str(stop), stop_reason=str(stop))
+        res.nfev = objective.nfev
         m, sigma = res.x
         a, d, c = cls._calibrate_adc(x, w, m, sigma)[0]
         rho = d/c
@@ -123,3 +308,200 @@ class SVI:
             return ret, res
         else:
             return ret
+
+    @classmethod
+    def fit_parabola(cls, x: FloatArray, w: FloatArray):
+        """Deterministic fallback fit of a parabola `w = alpha+beta*x+gamma*x**2`.
+        The parabola is expressed as the SVI curve with `m = 0` and `sigma`
+        large enough for the expansion
+          `w(x) ~ a + b*sigma + b*rho*x + b*x**2/(2*sigma)`
+        to hold on the quoted range and `|rho| < 1`. If the fitted parabola is
+        not convex, the flat curve at the mean total variance is returned.
+        Args:
+          x: Array of log-moneynesses
+          w: Array of total implied variances.
+        Returns:
+          Instance of the class.
+        """
+        x, w = np.asarray(x, dtype=float), np.asarray(w, dtype=float)
+        if len(x) < 3:
+            return cls(float(np.mean(w)), 0., 0., 0., 1.)
+        gamma, beta, alpha = np.polyfit(x, w, 2)
+        if gamma <= 0:
+            return cls(float(np.mean(w)), 0., 0., 0., 1.)
+        sigma = max(abs(beta)/(1.98*gamma), np.max(np.abs(x)), 1e-4)
+        b = 2*sigma*gamma
+        return cls(alpha-b*sigma, b, beta/b, 0., sigma)
+
+
+
+@dataclass
+class SSVI:
+    """The SSVI (surface SVI) model of Gatheral and Jacquier.
+    The model represents the whole volatility surface by the function
+      `w(x, theta) = theta/2*(1 + rho*phi*x + sqrt((phi*x + rho)**2 + 1 - rho**2))`
+    where `theta` is the ATM total implied variance of the expiry and
+      `phi = phi(theta) = eta/(theta**gamma*(1+theta)**(1-gamma))`
+    (power-law parametrization). Parameters `-1 < rho < 1`, `eta > 0` and
+    `0 < gamma <= 1/2` are shared by all expiries. The surface is free of
+    calendar arbitrage if `theta` is nondecreasing in time, and free of
+    butterfly arbitrage if moreover `eta*(1+|rho|) <= 2`.
+    Attributes:
+      rho, eta, gamma: Shared model parameters.
+      theta: Array of ATM total implied variances of the expiries.
+    Methods:
+      phi: The curvature function.
+      total_variance: Total implied variance of the expiry.
+      to_svi: Raw SVI parameters of every expiry.
+      calibrate: Calibrates parameters of the model.
+    """
+    rho: float
+    eta: float
+    gamma: float
+    theta: FloatArray
+
+    def phi(self, theta: Floats) -> Floats:
+        return self.eta/(theta**self.gamma*(1+theta)**(1-self.gamma))
+
+    def total_variance(self, x: Floats, theta: Floats) -> Floats:
+        phi_x = self.phi(theta)*x
+        return theta/2*(1 + self.rho*phi_x +
+                        np.sqrt((phi_x+self.rho)**2 + 1 - self.rho**2))
+
+    def to_svi(self) -> list:
+        """Returns the list of `SVI` (raw parameters) of the expiries:
+          `a = theta/2*(1-rho**2), b = theta*phi/2, rho,`
+          `m = -rho/phi, sigma = sqrt(1-rho**2)/phi`.
+        """
+        phi = self.phi(self.theta)
+        return [SVI(float(t/2*(1-self.rho**2)), float(t*f/2), float(self.rho),
+                    float(-self.rho/f), float(np.sqrt(1-self.rho**2)/f))
+                for t, f in zip(self.theta, phi)]
+
+    @classmethod
+    def calibrate(cls,
+                  x: Sequence[FloatArray],
+                  w: Sequence[FloatArray],
+                  butterfly_free: bool = True,
+                  max_gamma: float = 0.5,
+                  return_minimize_result: bool = False):
+        """Calibrates the parameters of the model to all expiries at once.
+        This function finds the parameters which minimize the sum of squares of
+        the differences of the given total implied variances and the ones
+        produced by the model over all expiries, in one bounded least-squares
+        problem (`scipy.optimize.least_squares`) with the residuals of all
+        quotes computed in one vectorized call.
+        ATM total variances are parametrized by nonnegative increments
+        `theta_i = theta_1 + sum of increments`, so `theta` is nondecreasing
+        in time and the surface is free of calendar arbitrage by
+        construction. If `butterfly_free`, `eta` is parametrized as
+        `2*s/(1+|rho|)` with `0 < s <= 1`.
+        Args:
+          x: Arrays of log-moneynesses of the expiries (in increasing order of
+            expiries).
+          w: Arrays of total implied variances of the expiries.
+          butterfly_free: Impose `eta*(1+|rho|) <= 2`.
+          max_gamma: Upper bound for `gamma` parameter.
+          return_minimize_result: If True, return also the minimization result.
+        Returns:
+          If `return_minimize_result` is True, returns a tuple `(cls, res)`,
+          where `cls` is an instance of the class with the calibrated
+          parameters and `res` in the optimization result. Otherwise returns
+          only `cls`.
+        """
+        n = len(x)
+        index = np.concatenate([np.full(len(x_i), i) for i, x_i in enumerate(x)])
+        x_all = np.concatenate([np.asarray(x_i, dtype=float) for x_i in x])
+        w_all = np.concatenate([np.asarray(w_i, dtype=float) for w_i in w])
+
+        # ATM total variances interpolated from quotes, made nondecreasing
+        theta0 = np.array([np.interp(0., *zip(*sorted(zip(x_i, w_i))))
+                           for x_i, w_i in zip(x, w)])
+        theta0 = np.maximum.accumulate(np.maximum(theta0, 1e-6))
+
+        def unpack(q):
+            rho, s, gamma = q[:3]
+            eta = 2*s/(1+abs(rho)) if butterfly_free else s
+            return cls(rho, eta, gamma, np.cumsum(q[3:]))
+
+        def residuals(q):
+            model = unpack(q)
+            return model.total_variance(x_all, model.theta[index]) - w_all
+
+        q0 = np.concatenate([[-0.3, 0.5, max_gamma/2], theta0[:1],
+                             np.diff(theta0)])
+        lower = np.concatenate([[-0.999, 1e-6, 1e-6, 1e-8], np.zeros(n-1)])
+        upper = np.concatenate([[0.999, 1. if butterfly_free else np.inf,
+                                 max_gamma], np.full(n, np.inf)])
+        res = optimize.least_squares(residuals, np.clip(q0, lower, upper),
+                                     bounds=(lower, upper))
+        ret = unpack(res.x)
+        if return_minimize_result:
+            return ret, res
+        else:
+            return ret
+
+class _StopCalibration(Exception):
+    """Raised by `_CalibrationBudget` to stop the outer minimization."""
+
+
+def _needs_full_bounds(q, bounds, full_bounds, w_bid, w_ask, tol=0.02):
+    """Whether the warm start result `q = (m, sigma)` has to be searched again
+    within `full_bounds`: it lies on (within `tol` of the width) a bound which
+    was narrowed, or the model is not within the bid-ask spread (the search
+    would have stopped there).
+    """
+    if w_bid is not None and w_ask is not None:
+        return True
+    for q_i, (low, high), (full_low, full_high) in zip(q, bounds, full_bounds):
+        if ((q_i-low <= tol*(high-low) and low > full_low) or
+                (high-q_i <= tol*(high-low) and high < full_high)):
+            return True
+    return False
+
+
+class _CalibrationBudget:
+    """Reduced objective of the outer step `(m, sigma) -> f` with a budget.
+    Counts evaluations, keeps the best point and stops the minimization (by
+    raising `_StopCalibration`) when `maxfev` evaluations or `time_limit`
+    seconds are spent, or when the model total variance at the best point
+    lies within `[w_bid, w_ask]` for all quotes.
+    """
+
+    def __init__(self, x, w, maxfev=None, time_limit=None, w_bid=None,
+                 w_ask=None):
+        self.x, self.w = x, w
+        self.maxfev, self.time_limit = maxfev, time_limit
+        self.w_bid, self.w_ask = w_bid, w_ask
+        self.nfev = 0
+        self.best_q = None
+        self.best_f = np.inf
+        self.start = time.perf_counter()
+
+    def __call__(self, q):
+        p, f = SVI._calibrate_adc(self.x, self.w, q[0], q[1])
+        self._record(np.array([q[0]]), np.array([q[1]]), p[None],
+                     np.array([f]))
+        return f
+
+    def batch(self, m, sigma):
+        p, f = SVI._calibrate_adc_batch(self.x, self.w, m, sigma)
+        m, sigma = np.broadcast_arrays(m, sigma)
+        self._record(m.ravel(), sigma.ravel(), p.reshape(-1, 3), f.ravel())
+        return f
+
+    def _record(self, m, sigma, p, f):
+        self.nfev += len(f)
+        i = np.argmin(f)
+        if f[i] < self.best_f:
+            self.best_f, self.best_q = f[i], (m[i], sigma[i])
+            if self.w_bid is not None and self.w_ask is not None:
+                y = (self.x-m[i])/sigma[i]
+                w_model = p[i][0] + p[i][1]*y + p[i][2]*np.sqrt(y**2+1)
+                if np.all((w_model >= self.w_bid) & (w_model <= self.w_ask)):
+                    raise _StopCalibration("within_bid_ask")
+        if self.maxfev is not None and self.nfev >= self.maxfev:
+            raise _StopCalibration("maxfev")
+        if (self.time_limit is not None and
+                time.perf_counter() - self.start >= self.time_limit):
+            raise _StopCalibration("time_limit")
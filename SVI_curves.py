@@ -1,113 +1,260 @@
 import numpy as np
-from SVI_calibrator import SVI
+from SVI_calibrator import SVI, SSVI
 import pandas as pd
+import multiprocessing
+from dataclasses import dataclass, field
+from typing import Optional
+import time
 
 import warnings
 warnings.filterwarnings('ignore')
 #-------------------------------------------------------------------------------------
 '''
 Function obtains data about implied volatility surface and calibrates parameters for each curves for SVI model in raw parametrization
+If parameter_store (SVIParameterStore) is given, calibration of each expiry starts from the parameters of the previous calibration, new parameters are saved to the store only if the slice is calibrated (not for fallbacks).
+With executor='process' expiries are calibrated in a process pool with max_workers workers, (x, w) arrays of every slice are sent to the workers and results are kept in the order of expiries;
+all slices share one deadline of timeout seconds, workers of slices which are not done by then are terminated and these slices (and failed ones) are calibrated again in the current process within time_limit (timeout if time_limit is None) seconds.
+Calibration of every slice is bounded: at most max_retries attempts (perturbed starts), maxfev evaluations and time_limit seconds per slice; it stops early when the curve lies within the bid-ask spread of total variance.
+If all attempts fail, the previous parameters of the expiry (or a parabola fit) are used; the outcome is kept in 'calibration_status'.
+Every slice keeps its SVISliceCurve in 'SVI_curve'; with lazy=True grids 'SVI_implied_volatilities' and 'w_SVI_total_variance' are not materialized (use the curve instead).
 Function returns implied volatility computed via SVI model for, calibrated parameters, max relative error between given implied volatility and computed implied volatility; saves data about previous calibration.
 '''
 
-def computing_SVI_IV(data_dict, ticker, low_limit = 0.1, high_limit = 2.5, N = 1000, extrapolation=True):
-    # download initial parameters from previous calibration
-#     initial_parameters = pd.read_csv('DATA\\Initial_parametres_for_SVI_calibrator\\List_initial_parameters_for_SVI.csv', index_col='expiry_date')
-#     initial_parameters_last = initial_parameters.loc[initial_parameters['date'] == initial_parameters['date'].unique()[-1]] #take last calibration
-    current_date = str(data_dict['data_date'].year) + '-' + str(data_dict['data_date'].month) +'-' + str(data_dict['data_date'].day)
-#     initial_parameters_new = pd.DataFrame(columns = initial_parameters.columns, index=['a', 'b', 'rho', 'm', 'sigma'])
-    
-    
-    for k in data_dict['implied_volatility_surface']:
+def computing_SVI_IV(data_dict, ticker, low_limit = 0.1, high_limit = 2.5, N = 1000, extrapolation=True, parameter_store=None, method="dual_annealing", executor=None, max_workers=None, timeout=None, lazy=False, max_retries=3, maxfev=None, time_limit=None):
+    # find last parameters for every expiration
+    initial_params = [parameter_store.get(ticker, k['expiry_date']) if parameter_store is not None else None for k in data_dict['implied_volatility_surface']]
+    if executor == 'process':
+        curves = computing_SVI_in_parallel(data_dict['implied_volatility_surface'], low_limit, high_limit, N, initial_params, extrapolation, method, max_workers, timeout, max_retries, maxfev, time_limit)
+    elif executor is None:
+        curves = [None] * len(initial_params)
+    else:
+        raise ValueError("Unknown executor: " + str(executor))
+
+    retry_time_limit = time_limit if time_limit is not None else timeout
+    for k, initial_param, curve in zip(data_dict['implied_volatility_surface'], initial_params, curves):
         expiry_date = k['expiry_date']
-        w_SVI = 'Fall'
-        counter_Fall = 0
-        
-#         if expiry_date in initial_parameters.columns: # find last parameters for given expiration
-#             initial_param = SVI(initial_parameters_last.loc['a', expiry_date], initial_parameters_last.loc['b', expiry_date], initial_parameters_last.loc['rho', expiry_date], initial_parameters_last.loc['m', expiry_date], initial_parameters_last.loc['sigma', expiry_date])
-#         else:
-        initial_param = []
-        while w_SVI == 'Fall': #sometimes functions from optimize library could fall and we need to repeat calibration
-            counter_Fall += 1
-            w_SVI, max_relative_error, set_param_raw, w_SVI_total_variance = compute_SVI(k, ticker, low_limit, high_limit, N, initial_param, extrapolation) #compute implied volatility from SVI
-        counter_Fall = counter_Fall - len(data_dict['implied_volatility_surface']) #count number of fall
-        k['SVI_implied_volatilities'] = w_SVI
-        k['max_relative_error'] = max_relative_error
-        k['set_param_raw'] = set_param_raw
-        k['w_SVI_total_variance'] = w_SVI_total_variance
-        
-        # save new calibrated parameters
-#         initial_parameters_new.loc['a', expiry_date] = set_param_raw.a
-#         initial_parameters_new.loc['b', expiry_date] = set_param_raw.b
-#         initial_parameters_new.loc['rho', expiry_date] = set_param_raw.rho
-#         initial_parameters_new.loc['m', expiry_date] = set_param_raw.m
-#         initial_parameters_new.loc['sigma', expiry_date] = set_param_raw.sigma
-        
-        #compute max relative error between implied volatility from SVI and bid ask spread given implied volatility
-        for j in range(0,len(max_relative_error)):
-            if (k['SVI_implied_volatilities'][j] >= k['bid_implied_volatilities'][j]) & (k['SVI_implied_volatilities'][j] <= k['ask_implied_volatilities'][j]):
-                k['max_relative_error'][j] = 0
-            else:
-                if k['SVI_implied_volatilities'][j] > k['ask_implied_volatilities'][j]:
-                    k['max_relative_error'][j] = k['SVI_implied_volatilities'][j] - k['ask_implied_volatilities'][j]
-                else:
-                    k['max_relative_error'][j] = k['bid_implied_volatilities'][j] - k['SVI_implied_volatilities'][j]
-        
-    
+
+        if curve is None: # failed or timed out in the pool
+            curve = calibrate_SVI_slice_with_budget(*get_SVI_slice_data(k), low_limit, high_limit, N, initial_param, extrapolation, method, *get_SVI_slice_band(k), max_retries, maxfev, retry_time_limit) #compute implied volatility from SVI
+        set_SVI_curve(k, curve, lazy)
+
+        # save new calibrated parameters (fallbacks are not kept as warm starts)
+        if parameter_store is not None and curve.calibration_info.get('status') == 'calibrated':
+            parameter_store.put(ticker, expiry_date, curve.set_param_raw)
+
+
     # keep new calibrated parameters
-#     initial_parameters_new['date'] = current_date
-#     if not current_date in initial_parameters['date'].unique():
-#         initial_parameters = pd.concat([initial_parameters, initial_parameters_new])
-#     initial_parameters.to_csv('DATA\\Initial_parametres_for_SVI_calibrator\\List_initial_parameters_for_SVI.csv', index= True, index_label='expiry_date')
-        
+    if parameter_store is not None:
+        parameter_store.evict_expired(data_dict['data_date'])
+        parameter_store.save()
+
+    return data_dict
+
+#-----------------------------------------------
+'''
+Function obtains data about implied volatility surface and calibrates SSVI model (shared rho, eta, gamma and ATM total variance of every expiry) to all expiries at once.
+ATM total variance is nondecreasing in time, so the surface is free of calendar arbitrage (and of butterfly arbitrage with butterfly_free=True).
+Every slice gets the same keys as in computing_SVI_IV with raw SVI parameters of its expiry and the calibrated SSVI model (shared by slices) in 'SSVI', so data_dict can be read-only (VolSurface).
+'''
+def computing_SSVI_IV(data_dict, low_limit = 0.1, high_limit = 2.5, N = 1000, extrapolation=True, lazy=False, butterfly_free=True):
+    surface = sorted(data_dict['implied_volatility_surface'], key=lambda k: k['expiry_date_in_act365_year_fraction'])
+    slices = [get_SVI_slice_data(k) for k in surface]
+    ssvi, res = SSVI.calibrate([x for x, _, _ in slices], [w for _, w, _ in slices], butterfly_free=butterfly_free, return_minimize_result=True)
+    for k, (x_array, _, T), set_param_raw in zip(surface, slices, ssvi.to_svi()):
+        k['SSVI'] = ssvi
+        curve = SVISliceCurve(set_param_raw, T, x_array, low_limit, high_limit, N, extrapolation, {'status': 'SSVI', 'nfev': res.nfev, 'stop_reason': res.message})
+        set_SVI_curve(k, curve, lazy)
     return data_dict
 
+#-----------------------------------------------
+# keep calibrated curve, its parameters, grids (unless lazy) and errors in the slice
+def set_SVI_curve(k, curve, lazy=False):
+    k['SVI_curve'] = curve
+    k['calibration_status'] = curve.calibration_info
+    k['set_param_raw'] = curve.set_param_raw
+    if not lazy:
+        k['SVI_implied_volatilities'] = curve.implied_volatility_grid
+        k['w_SVI_total_variance'] = curve.total_variance_grid
+
+    #compute max relative error between implied volatility from SVI and bid ask spread given implied volatility (relative error to mid without bid ask data)
+    errors = curve.errors(k['mid_implied_volatilities'], k.get('bid_implied_volatilities'), k.get('ask_implied_volatilities'))
+    k['max_relative_error'] = errors['bid_ask_error'] if 'bid_ask_error' in errors else errors['mid_relative_error']
+
+#-----------------------------------------------
+'''
+Function calibrates SVI slices of the surface in a process pool, every worker obtains only log-moneyness and total variance arrays of its slice.
+All slices are awaited against one deadline (timeout seconds from submission); if some are not done by then, the pool is terminated, so hung calibrations do not keep running.
+Function returns list of SVISliceCurve in the order of expiries (None for failed or timed out slices).
+'''
+def computing_SVI_in_parallel(implied_volatility_surface, low_limit, high_limit, N, initial_params, extrapolation=True, method="dual_annealing", max_workers=None, timeout=None, max_retries=3, maxfev=None, time_limit=None):
+    pool = multiprocessing.Pool(processes=max_workers)
+    results = []
+    try:
+        results = [pool.apply_async(calibrate_SVI_slice_with_budget, (*get_SVI_slice_data(k), low_limit, high_limit, N, initial_param, extrapolation, method, *get_SVI_slice_band(k), max_retries, maxfev, time_limit)) for k, initial_param in zip(implied_volatility_surface, initial_params)]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for result in results:
+            result.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        curves = [result.get() if result.ready() and result.successful() else None for result in results]
+    finally:
+        if all(result.ready() for result in results):
+            pool.close()
+        else: # timed out (or interrupted): stop running workers
+            pool.terminate()
+        pool.join()
+    return curves
+
 #-----------------------------------------------
 # compute implied volatility for given parameteres and log-moneyness: x = ln(strike/forward)
 def get_w_SVI_raw(set_param_raw, x):
     return set_param_raw.a + set_param_raw.b*(set_param_raw.rho*(x-set_param_raw.m) + np.sqrt((x-set_param_raw.m)**2 + set_param_raw.sigma**2))
 
+#-----------------------------------------------
+@dataclass
+class SVISliceCurve:
+    """Calibrated SVI curve of one expiry.
+    Total variance and implied volatility are evaluated on arbitrary arrays
+    of log-moneyness in one vectorized call. The grid (log-moneyness of
+    `linspace(low_limit, high_limit, N)` or quoted log-moneyness without
+    extrapolation) is materialized only on demand and cached.
+    Attributes:
+      set_param_raw: Calibrated raw SVI parameters.
+      T: Expiry in ACT/365 year fraction.
+      x_quotes: Log-moneyness of quoted strikes.
+      low_limit, high_limit, N, extrapolation: Grid specification.
+      calibration_info: Outcome of the calibration (status, attempts, number
+        of evaluations, elapsed seconds, stop reason).
+    Methods:
+      total_variance, implied_volatility: Evaluation on arrays.
+      errors: Error metrics against mid (and bid, ask) implied volatility.
+    """
+    set_param_raw: SVI
+    T: float
+    x_quotes: np.ndarray
+    low_limit: float = 0.1
+    high_limit: float = 2.5
+    N: int = 1000
+    extrapolation: bool = True
+    calibration_info: dict = field(default_factory=dict, compare=False)
+    _grid: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+
+    def total_variance(self, x):
+        """Total implied variance for (array of) log-moneyness `x`."""
+        return get_w_SVI_raw(self.set_param_raw, np.asarray(x, dtype=float))
+
+    def implied_volatility(self, x):
+        """Implied volatility for (array of) log-moneyness `x`."""
+        return np.sqrt(self.total_variance(x) / self.T)
+
+    @property
+    def x_grid(self):
+        return self._materialize_grid()[0]
+
+    @property
+    def total_variance_grid(self):
+        return self._materialize_grid()[1]
+
+    @property
+    def implied_volatility_grid(self):
+        return self._materialize_grid()[2]
+
+    def _materialize_grid(self):
+        if self._grid is None:
+            x_grid = np.log(np.linspace(self.low_limit, self.high_limit, self.N)) if self.extrapolation else np.asarray(self.x_quotes, dtype=float)
+            total_variance = self.total_variance(x_grid)
+            self._grid = (x_grid, total_variance, np.sqrt(total_variance / self.T))
+        return self._grid
+
+    def errors(self, mid_implied_volatilities, bid_implied_volatilities=None, ask_implied_volatilities=None):
+        """Error metrics of the curve on quoted strikes.
+        Args:
+          mid_implied_volatilities: Mid implied volatilities of quotes.
+          bid_implied_volatilities, ask_implied_volatilities: Optional bid and
+            ask implied volatilities of quotes.
+        Returns:
+          Dictionary with `mid_relative_error` (relative error to mid) and, if
+          bid and ask are given, `bid_ask_error` (0 inside the bid-ask spread,
+          distance to the nearest side outside of it).
+        """
+        implied_volatility = self.implied_volatility(self.x_quotes)
+        mid = np.asarray(mid_implied_volatilities, dtype=float)
+        errors = {'mid_relative_error': (implied_volatility - mid) / mid}
+        if bid_implied_volatilities is not None and ask_implied_volatilities is not None:
+            bid = np.asarray(bid_implied_volatilities, dtype=float)
+            ask = np.asarray(ask_implied_volatilities, dtype=float)
+            errors['bid_ask_error'] = np.where(implied_volatility > ask, implied_volatility - ask, np.where(implied_volatility < bid, bid - implied_volatility, 0.0))
+        return errors
+
 #-----------------------------------------------
 '''
 Function obtains data about implied volatility and calibrates parameters for SVI model
 Function returns implied volatility computed via SVI model, calibrated parameters, max relative error between given implied volatility and computed implied volatility.
 '''
-def compute_SVI(k, ticker, low_limit, high_limit, N, initial_param, extrapolation=True):
-    x_array = np.log(np.array(k['strikes'])/k['reference_forward']) # log-moneyness
-    w_array = np.power(k['mid_implied_volatilities'],2) * k['expiry_date_in_act365_year_fraction'] #total varience
-    #choose initial parameters
-    a = 1 / 2 * np.min(w_array)
-    if initial_param:
-        set_param = initial_param
-    else:
-        set_param = SVI(a, 0.1, -0.5, 0.1, 0.1)
-    
-    #calibrate SVI parameters, sometimes functions from optimize library could fall and we need to repeat calibration
+def compute_SVI(k, ticker, low_limit, high_limit, N, initial_param, extrapolation=True, method="dual_annealing"):
+    curve = calibrate_SVI_slice(*get_SVI_slice_data(k), low_limit, high_limit, N, initial_param, extrapolation, method)
+    if curve is None:
+        return "Fall", None, None, None
+    max_relative_error = curve.errors(k['mid_implied_volatilities'])['mid_relative_error']
+    return curve.implied_volatility_grid, max_relative_error, curve.set_param_raw, curve.total_variance_grid
+
+#-----------------------------------------------
+# take log-moneyness, total variance and year fraction of given slice of implied volatility surface
+def get_SVI_slice_data(k):
+    x_array = np.log(np.asarray(k['strikes'], dtype=float)/k['reference_forward']) # log-moneyness
+    w_array = np.power(np.asarray(k['mid_implied_volatilities'], dtype=float),2) * k['expiry_date_in_act365_year_fraction'] #total varience
+    return x_array, w_array, k['expiry_date_in_act365_year_fraction']
+
+# take total variance of bid and ask of given slice (None without bid ask data)
+def get_SVI_slice_band(k):
+    if k.get('bid_implied_volatilities') is None or k.get('ask_implied_volatilities') is None:
+        return None, None
+    T = k['expiry_date_in_act365_year_fraction']
+    return np.power(np.asarray(k['bid_implied_volatilities'], dtype=float),2) * T, np.power(np.asarray(k['ask_implied_volatilities'], dtype=float),2) * T
+
+#-----------------------------------------------
+'''
+Function calibrates parameters for SVI model for given log-moneyness and total variance arrays of one slice
+Function returns SVISliceCurve or None if calibration falls.
+'''
+def calibrate_SVI_slice(x_array, w_array, T, low_limit, high_limit, N, initial_param, extrapolation=True, method="dual_annealing", w_bid=None, w_ask=None, maxfev=None, time_limit=None, seed=None):
+    #calibrate SVI parameters starting from initial parameters (if any), sometimes functions from optimize library could fall
     try:
-        set_param_raw = set_param.calibrate(x_array,w_array) #algoritm based on code of Zhitluhin M.V.
+        set_param_raw, res = SVI.calibrate(x_array, w_array, method=method, initial_param=initial_param or None, seed=seed, maxfev=maxfev, time_limit=time_limit, w_bid=w_bid, w_ask=w_ask, return_minimize_result=True) #algoritm based on code of Zhitluhin M.V.
     except Exception:
-        return "Fall", None, None, None
+        return None
+    if not np.all(np.isfinite([set_param_raw.a, set_param_raw.b, set_param_raw.rho, set_param_raw.m, set_param_raw.sigma])):
+        return None
+    return SVISliceCurve(set_param_raw, T, x_array, low_limit, high_limit, N, extrapolation, {'status': 'calibrated', 'nfev': res.nfev, 'stop_reason': res.stop_reason})
 
-    # compute relative error 
-    w_SVI_relative_error = np.linspace(0,0,len(x_array))
-    for ind,i in enumerate(x_array):
-        w_SVI_relative_error[ind] = get_w_SVI_raw(set_param_raw, i) # compute total varience for given parameters
-    w_SVI_relative_error = np.sqrt(w_SVI_relative_error / k['expiry_date_in_act365_year_fraction']) #convert to implied volatility
-    max_error = w_SVI_relative_error - np.array(k['mid_implied_volatilities'])
-    max_relative_error = max_error / np.array(k['mid_implied_volatilities'])
-    
-    # give value for log-moneyness
-    if extrapolation:
-        x_grid = np.log(np.linspace(low_limit, high_limit, N))
-        w_SVI_raw = np.linspace(0,0,N)
+#-----------------------------------------------
+'''
+Function calibrates parameters for SVI model for one slice within a budget: at most max_retries attempts, maxfev evaluations per attempt and time_limit seconds for all attempts.
+Every retry starts from perturbed initial parameters with its own seed; if all attempts fail, previous parameters (initial_param) or the parabola fit are used.
+Function returns SVISliceCurve, outcome of the calibration is kept in its calibration_info.
+'''
+def calibrate_SVI_slice_with_budget(x_array, w_array, T, low_limit, high_limit, N, initial_param, extrapolation=True, method="dual_annealing", w_bid=None, w_ask=None, max_retries=3, maxfev=None, time_limit=None):
+    start = time.perf_counter()
+    attempts = 0
+    for attempt in range(max_retries):
+        remaining = None if time_limit is None else time_limit - (time.perf_counter() - start)
+        if remaining is not None and remaining <= 0:
+            break
+        attempts += 1
+        start_param = initial_param if attempt == 0 else perturb_SVI_param(initial_param, attempt)
+        curve = calibrate_SVI_slice(x_array, w_array, T, low_limit, high_limit, N, start_param, extrapolation, method, w_bid, w_ask, maxfev, remaining, seed=attempt)
+        if curve is not None:
+            curve.calibration_info.update(attempts=attempts, elapsed=time.perf_counter() - start)
+            return curve
+    # deterministic fallback
+    if initial_param:
+        set_param_raw, status = initial_param, 'previous_parameters'
     else:
-        x_grid = x_array
-        w_SVI_raw = np.linspace(0,0,len(x_array))
-    
-    # compute implied volatility
-    for ind, i in enumerate(x_grid):
-        w_SVI_raw[ind] = get_w_SVI_raw(set_param_raw, i) # compute total varience for given parameters
-    w_SVI_total_variance = w_SVI_raw
-    w_SVI_raw = np.sqrt(w_SVI_total_variance / k['expiry_date_in_act365_year_fraction']) #convert to implied volatility
-
-    return w_SVI_raw, max_relative_error, set_param_raw, w_SVI_total_variance
+        set_param_raw, status = SVI.fit_parabola(x_array, w_array), 'parabola'
+    info = {'status': status, 'nfev': None, 'stop_reason': 'failed', 'attempts': attempts, 'elapsed': time.perf_counter() - start}
+    return SVISliceCurve(set_param_raw, T, x_array, low_limit, high_limit, N, extrapolation, info)
+
+# shift m and scale sigma of the initial parameters for the retry number attempt (without initial parameters start from scratch)
+def perturb_SVI_param(initial_param, attempt):
+    if not initial_param:
+        return None
+    rng = np.random.default_rng(attempt)
+    return SVI(initial_param.a, initial_param.b, initial_param.rho, initial_param.m + rng.normal(0, 0.05), initial_param.sigma * np.exp(rng.normal(0, 0.5)))
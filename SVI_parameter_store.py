@@ -0,0 +1,72 @@
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+import numpy as np
+from SVI_calibrator import SVI
+
+
+class SVIParameterStore:
+    """Persistent store of calibrated SVI parameters used for warm starts.
+    Parameters are keyed by `(ticker, expiry_date)` and kept in memory in
+    least-recently-used order (at most `capacity` slices). On disk the store
+    is one compact `.npz` file with arrays of keys and a float64 matrix of
+    parameters `a, b, rho, m, sigma`.
+    Attributes:
+      filename: Path of the `.npz` file.
+      capacity: Maximal number of kept slices.
+    Methods:
+      get: Returns last parameters for given ticker and expiry date.
+      put: Keeps new parameters.
+      evict_expired: Drops parameters of expired maturities.
+      load, save: Reads and writes the file.
+    """
+
+    def __init__(self, filename: str = 'DATA//Initial_parametres_for_SVI_calibrator//SVI_parameters.npz',
+                 capacity: int = 4096):
+        self.filename = filename
+        self.capacity = capacity
+        self._parameters = OrderedDict()
+        if os.path.exists(filename):
+            self.load()
+
+    def get(self, ticker: str, expiry_date: str) -> Optional[SVI]:
+        """Returns last parameters for given ticker and expiry date or None."""
+        key = (ticker, expiry_date)
+        if key not in self._parameters:
+            return None
+        self._parameters.move_to_end(key)
+        return SVI(*self._parameters[key].tolist())
+
+    def put(self, ticker: str, expiry_date: str, set_param_raw: SVI):
+        """Keeps new parameters for given ticker and expiry date."""
+        key = (ticker, expiry_date)
+        self._parameters[key] = np.array([set_param_raw.a, set_param_raw.b, set_param_raw.rho, set_param_raw.m, set_param_raw.sigma])
+        self._parameters.move_to_end(key)
+        while len(self._parameters) > self.capacity:
+            self._parameters.popitem(last=False)
+
+    def evict_expired(self, current_date: datetime):
+        """Drops parameters of maturities which are before `current_date`."""
+        for key in [key for key in self._parameters if datetime.strptime(key[1], "%Y-%m-%d") < current_date.replace(hour=0, minute=0, second=0, microsecond=0)]:
+            del self._parameters[key]
+
+    def load(self):
+        with np.load(self.filename) as data:
+            self._parameters = OrderedDict(((str(ticker), str(expiry_date)), parameters)
+                                           for ticker, expiry_date, parameters in zip(data['tickers'], data['expiry_dates'], data['parameters']))
+
+    def save(self):
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        keys = list(self._parameters)
+        temporary_filename = self.filename + '.tmp.npz'
+        np.savez(temporary_filename,
+                 tickers=np.array([key[0] for key in keys], dtype=str),
+                 expiry_dates=np.array([key[1] for key in keys], dtype=str),
+                 parameters=np.array(list(self._parameters.values()), dtype=np.float64).reshape(-1, 5))
+        os.replace(temporary_filename, self.filename) # the file is never left half written
+
+    def __len__(self):
+        return len(self._parameters)
@@ -0,0 +1,201 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+import pandas as pd
+
+
+class SnapshotCatalog:
+    """Persistent catalog (SQLite) of option chain snapshots.
+    For every snapshot file the catalog keeps its underlying, time, location,
+    number of rows, spot (first `last close`) and its expiry dates with
+    numbers of rows, so batch jobs select the files they need without opening
+    them. Collectors register files as they write them (`register`); files
+    written by other processes are picked up incrementally by `refresh`
+    (only new or modified files are read, deleted ones are dropped).
+    Attributes:
+      filename: Path of the SQLite database.
+    Methods:
+      register: Records one snapshot.
+      refresh: Synchronizes the catalog with a directory of snapshots.
+      query: Selects snapshots by underlying, time range and expiry.
+      expiries: Expiry dates of one snapshot.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY,
+            underlying TEXT NOT NULL,
+            snapshot_time TEXT NOT NULL,
+            path TEXT NOT NULL UNIQUE,
+            mtime REAL,
+            size INTEGER,
+            row_count INTEGER,
+            spot REAL);
+        CREATE INDEX IF NOT EXISTS snapshots_underlying_time ON snapshots (underlying, snapshot_time);
+        CREATE TABLE IF NOT EXISTS expiries (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+            expiry_date TEXT NOT NULL,
+            expiry TEXT,
+            row_count INTEGER,
+            PRIMARY KEY (snapshot_id, expiry_date));
+        CREATE INDEX IF NOT EXISTS expiries_expiry_date ON expiries (expiry_date);
+        CREATE INDEX IF NOT EXISTS expiries_expiry ON expiries (expiry);
+    """
+
+    def __init__(self, filename: str = 'DATA//snapshot_catalog.sqlite'):
+        self.filename = filename
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL') # readers are not blocked by collectors
+        self._connection.execute('PRAGMA foreign_keys=ON')
+        self._connection.executescript(self._SCHEMA)
+        self._lock = threading.RLock() # connection is shared by collector threads
+
+    def close(self):
+        self._connection.close()
+
+    def register(self, path: str, underlying: str, snapshot_time: datetime, data_options: Optional[pd.DataFrame] = None):
+        """Records snapshot file `path` (replaces previous record of the file).
+        If `data_options` (content of the file) is not given, the file is read.
+        """
+        path = os.path.normpath(path)
+        if data_options is None:
+            data_options = read_snapshot(path, columns=['expiryDate', 'last close'])
+        stat = os.stat(path)
+        row_counts = data_options['expiryDate'].astype(str).value_counts(sort=False)
+        spot = float(data_options['last close'].iloc[0]) if len(data_options) else None
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM snapshots WHERE path = ?', (path,))
+            snapshot_id = self._connection.execute(
+                'INSERT INTO snapshots (underlying, snapshot_time, path, mtime, size, row_count, spot) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (underlying, _format_time(snapshot_time), path, stat.st_mtime, stat.st_size, len(data_options), spot)).lastrowid
+            self._connection.executemany(
+                'INSERT INTO expiries (snapshot_id, expiry_date, expiry, row_count) VALUES (?, ?, ?, ?)',
+                [(snapshot_id, expiry_date, _parse_expiry(expiry_date), int(row_count)) for expiry_date, row_count in row_counts.items()])
+
+    def refresh(self, directory: str = 'DATA//Crypto_currencies') -> int:
+        """Synchronizes the catalog with snapshot files in `directory`, returns number of (re)registered files.
+        Recognized layouts: `<directory>/<ticker>/<Y-M-D-H-M[-S]>.csv`,
+        `<directory>/<Y-M-D_H-M>/<ticker>.csv` and the snapshot store
+        `<directory>/underlying=<ticker>/date=<date>/<YmdTHMS>.parquet|.arrow`.
+        """
+        prefix = os.path.join(os.path.normpath(directory), '')
+        with self._lock:
+            known = {path: (mtime, size) for path, mtime, size in self._connection.execute('SELECT path, mtime, size FROM snapshots') if path.startswith(prefix)}
+        number_of_files = 0
+        found = set()
+        for path, underlying, snapshot_time in _find_snapshots(directory):
+            found.add(path)
+            stat = os.stat(path)
+            if known.get(path) == (stat.st_mtime, stat.st_size):
+                continue
+            self.register(path, underlying, snapshot_time)
+            number_of_files += 1
+        with self._lock, self._connection:
+            self._connection.executemany('DELETE FROM snapshots WHERE path = ?', [(path,) for path in known if path not in found])
+        return number_of_files
+
+    def query(self,
+              underlying: Optional[str] = None,
+              start: Optional[datetime] = None,
+              end: Optional[datetime] = None,
+              expiry_date: Optional[str] = None,
+              expiry_from: Optional[datetime] = None,
+              expiry_to: Optional[datetime] = None) -> pd.DataFrame:
+        """Selects snapshots in time order.
+        Args:
+          underlying: Ticker (all tickers if None).
+          start, end: Range of snapshot times, `start <= snapshot_time < end`.
+          expiry_date: Keep snapshots which contain this expiry date (as in
+            `expiryDate` column).
+          expiry_from, expiry_to: Keep snapshots which contain an expiry
+            within `[expiry_from, expiry_to]`.
+        Returns:
+          Dataframe with columns `id, underlying, snapshot_time, path,
+          row_count, spot`.
+        """
+        conditions, parameters = [], []
+        if underlying is not None:
+            conditions.append('underlying = ?')
+            parameters.append(underlying)
+        if start is not None:
+            conditions.append('snapshot_time >= ?')
+            parameters.append(_format_time(start))
+        if end is not None:
+            conditions.append('snapshot_time < ?')
+            parameters.append(_format_time(end))
+        if expiry_date is not None:
+            conditions.append('id IN (SELECT snapshot_id FROM expiries WHERE expiry_date = ?)')
+            parameters.append(str(expiry_date))
+        if expiry_from is not None or expiry_to is not None:
+            conditions.append('id IN (SELECT snapshot_id FROM expiries WHERE expiry >= ? AND expiry <= ?)')
+            parameters += [_format_time(expiry_from or datetime.min), _format_time(expiry_to or datetime.max)]
+        query = 'SELECT id, underlying, snapshot_time, path, row_count, spot FROM snapshots'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        with self._lock:
+            snapshots = pd.read_sql_query(query + ' ORDER BY snapshot_time, underlying', self._connection, params=parameters)
+        snapshots['snapshot_time'] = pd.to_datetime(snapshots['snapshot_time'], format='ISO8601')
+        return snapshots
+
+    def expiries(self, snapshot_id: int) -> pd.DataFrame:
+        """Expiry dates of snapshot with numbers of rows."""
+        with self._lock:
+            return pd.read_sql_query('SELECT expiry_date, expiry, row_count FROM expiries WHERE snapshot_id = ? ORDER BY expiry',
+                                     self._connection, params=(int(snapshot_id),))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0]
+
+
+# time of snapshot from name of CSV file or folder ('2023-3-10-12-5', '2023-3-10-12-5-30' or '2023-03-10_12-5'), None if name is not a time
+def parse_snapshot_time(name: str) -> Optional[datetime]:
+    numbers = re.fullmatch(r'(\d{4})-(\d{1,2})-(\d{1,2})[-_](\d{1,2})-(\d{1,2})(?:-(\d{1,2}))?', name)
+    if numbers is None:
+        return None
+    return datetime(*[int(number) for number in numbers.groups() if number is not None])
+
+
+# snapshot files of directory: (path, underlying, snapshot time)
+def _find_snapshots(directory):
+    for path, _, filenames in os.walk(directory):
+        folder = os.path.basename(path)
+        for filename in sorted(filenames):
+            name, extension = os.path.splitext(filename)
+            if extension == '.csv':
+                folder_time = parse_snapshot_time(folder)
+                underlying, snapshot_time = (folder, parse_snapshot_time(name)) if folder_time is None else (name, folder_time)
+            elif extension in ('.parquet', '.arrow') and os.path.basename(os.path.dirname(path)).startswith('underlying='):
+                underlying = os.path.basename(os.path.dirname(path))[len('underlying='):]
+                snapshot_time = datetime.strptime(name, '%Y%m%dT%H%M%S')
+            else:
+                continue
+            if snapshot_time is not None:
+                yield os.path.normpath(os.path.join(path, filename)), underlying, snapshot_time
+
+
+# option chain of snapshot file of any format (CSV, Parquet or Arrow IPC of the snapshot store), all columns if columns is None
+def read_snapshot(path: str, columns: Optional[list] = None) -> pd.DataFrame:
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    if path.endswith('.arrow'):
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+# times are kept as text of fixed width, so they compare in time order
+def _format_time(time):
+    return time.isoformat(sep=' ', timespec='microseconds')
+
+
+def _parse_expiry(expiry_date):
+    try:
+        return _format_time(pd.Timestamp(expiry_date))
+    except ValueError:
+        return None
@@ -0,0 +1,172 @@
+import os
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+import pandas as pd
+from Snapshot_catalog import parse_snapshot_time
+
+pa = ds = pq = fs = None # pyarrow is optional (needed only by the store), imported by the first SnapshotStore
+
+
+def _import_pyarrow():
+    global pa, ds, pq, fs
+    if pa is None:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+        import pyarrow.fs
+        pa, ds, pq, fs = pyarrow, pyarrow.dataset, pyarrow.parquet, pyarrow.fs
+
+
+class SnapshotStore:
+    """Columnar store of option chain snapshots (Parquet or Arrow IPC dataset).
+    Every snapshot is one file in the partition `underlying=<ticker>/date=<YYYY-MM-DD>`
+    of the dataset (hive partitioning). Columns of option chains are stored
+    with fixed types (`COLUMN_TYPES`, pyarrow type aliases, other columns
+    with inferred types); `snapshot_time` and `expiry` (expiry date as
+    timestamp) are added for filtering. pyarrow is imported by the first
+    store, modules which only write CSV files do not need it.
+    Reads use column projection and filters pushed down to the dataset (time
+    range, expiry dates, moneyness band `strike / last close`), files are
+    memory mapped; selected rows are returned as a pandas copy.
+    Attributes:
+      root: Directory of the dataset.
+      file_format: "parquet" or "arrow" (Arrow IPC).
+      catalog: Optional `SnapshotCatalog`, written snapshots are registered in it.
+    Methods:
+      write: Writes one snapshot.
+      read: Reads snapshots as dataframe.
+      snapshot_times: Times of stored snapshots.
+      migrate_csv: Writes existing CSV snapshots to the store.
+    """
+
+    COLUMN_TYPES = {
+        'instrumentName': 'string',
+        'contractSymbol': 'string',
+        'lastTradeDate': 'string',
+        'expiryDate': 'string',
+        'strike': 'float64',
+        'optionType': 'string',
+        'last close': 'float64',
+        'lastPrice': 'float64',
+        'bid': 'float64',
+        'ask': 'float64',
+        'mid': 'float64',
+        'volume': 'float64',
+        'openInterest': 'float64',
+        'impliedVolatility': 'float64',
+        'DerebitIV': 'float64',
+        'fetchTimestamp': 'int64',
+        'yFinance_dividend_yield': 'float64',
+        'ticker': 'string',
+        'snapshot_time': 'timestamp[ms]',
+        'expiry': 'timestamp[ms]',
+    }
+
+    def __init__(self, root: str = 'DATA//Snapshots', file_format: str = 'parquet', catalog=None):
+        if file_format not in ('parquet', 'arrow'):
+            raise ValueError("Unknown file format: " + str(file_format))
+        self.root = root
+        self.file_format = file_format
+        self.catalog = catalog
+        _import_pyarrow()
+        self._partitioning = ds.partitioning(pa.schema([('underlying', pa.string()), ('date', pa.string())]), flavor='hive')
+        self._filesystem = fs.LocalFileSystem(use_mmap=True)
+
+    def write(self, data_options: pd.DataFrame, underlying: str, snapshot_time: Optional[datetime] = None) -> str:
+        """Writes snapshot of option chain of `underlying` taken at `snapshot_time` (now by default), returns path of the file."""
+        snapshot_time = pd.Timestamp(snapshot_time or datetime.now()).floor('ms').to_pydatetime() # columns are stored in ms
+        data_options = data_options.assign(snapshot_time=snapshot_time,
+                                           expiry=pd.to_datetime(data_options['expiryDate'].astype(str), format='mixed'),
+                                           expiryDate=data_options['expiryDate'].astype(str))
+        table = pa.Table.from_pandas(data_options, preserve_index=False)
+        table = table.cast(pa.schema([pa.field(name, pa.type_for_alias(self.COLUMN_TYPES[name]) if name in self.COLUMN_TYPES else table.schema.field(name).type) for name in table.column_names]))
+
+        directory = os.path.join(self.root, 'underlying=' + underlying, 'date=' + snapshot_time.strftime('%Y-%m-%d'))
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, snapshot_time.strftime('%Y%m%dT%H%M%S') + ('.parquet' if self.file_format == 'parquet' else '.arrow'))
+        temporary_filename = filename + '.tmp'
+        if self.file_format == 'parquet':
+            pq.write_table(table, temporary_filename)
+        else:
+            with pa.OSFile(temporary_filename, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temporary_filename, filename) # the file is never left half written
+        if self.catalog is not None:
+            self.catalog.register(filename, underlying, snapshot_time, data_options)
+        return filename
+
+    def read(self,
+             underlying: Optional[str] = None,
+             columns: Optional[Sequence[str]] = None,
+             start: Optional[datetime] = None,
+             end: Optional[datetime] = None,
+             expiry_dates: Optional[Sequence[str]] = None,
+             moneyness: Optional[Tuple[float, float]] = None) -> pd.DataFrame:
+        """Reads snapshots as one dataframe.
+        Args:
+          underlying: Ticker (all tickers if None).
+          columns: Columns to read (all if None).
+          start, end: Range of snapshot times, `start <= snapshot_time < end`.
+          expiry_dates: Expiry dates (as in `expiryDate` column) to keep.
+          moneyness: Band `(low, high)` of `strike / last close` to keep.
+        Returns:
+          Dataframe with rows of selected snapshots.
+        """
+        dataset = self._dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=columns)
+        condition = None
+        conditions = []
+        if underlying is not None:
+            conditions.append(ds.field('underlying') == underlying)
+        if start is not None:
+            conditions += [ds.field('date') >= start.strftime('%Y-%m-%d'), ds.field('snapshot_time') >= pa.scalar(start, pa.timestamp('ms'))]
+        if end is not None:
+            conditions += [ds.field('date') <= end.strftime('%Y-%m-%d'), ds.field('snapshot_time') < pa.scalar(end, pa.timestamp('ms'))]
+        if expiry_dates is not None:
+            conditions.append(ds.field('expiryDate').isin([str(expiry_date) for expiry_date in expiry_dates]))
+        if moneyness is not None:
+            conditions += [ds.field('strike') >= ds.field('last close') * moneyness[0], ds.field('strike') <= ds.field('last close') * moneyness[1]]
+        for c in conditions:
+            condition = c if condition is None else condition & c
+        return dataset.to_table(columns=list(columns) if columns is not None else None, filter=condition).to_pandas()
+
+    def snapshot_times(self, underlying: Optional[str] = None) -> list:
+        """Sorted times of stored snapshots (from file names, without reading data)."""
+        times = []
+        directory = self.root if underlying is None else os.path.join(self.root, 'underlying=' + underlying)
+        for path, _, filenames in os.walk(directory):
+            times += [datetime.strptime(filename.split('.')[0], '%Y%m%dT%H%M%S') for filename in filenames if filename.endswith(('.parquet', '.arrow'))]
+        return sorted(times)
+
+    def migrate_csv(self, directory: str = 'DATA//Crypto_currencies') -> int:
+        """Writes CSV snapshots to the store, returns number of written snapshots.
+        Two layouts are recognized: `<directory>/<ticker>/<Y-M-D-H-M[-S]>.csv`
+        (crypto currencies) and `<directory>/<Y-M-D_H-M>/<ticker>.csv` (option
+        chains of equities).
+        """
+        number_of_snapshots = 0
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isdir(path):
+                continue
+            folder_time = parse_snapshot_time(name)
+            for filename in sorted(os.listdir(path)):
+                if not filename.endswith('.csv'):
+                    continue
+                if folder_time is None:
+                    underlying, snapshot_time = name, parse_snapshot_time(filename[:-4])
+                else:
+                    underlying, snapshot_time = filename[:-4], folder_time
+                if snapshot_time is None:
+                    continue
+                self.write(pd.read_csv(os.path.join(path, filename)), underlying, snapshot_time)
+                number_of_snapshots += 1
+        return number_of_snapshots
+
+    def _dataset(self):
+        if not os.path.exists(self.root):
+            return None
+        return ds.dataset(self.root, format='parquet' if self.file_format == 'parquet' else 'ipc',
+                          partitioning=self._partitioning, filesystem=self._filesystem, exclude_invalid_files=True)
+
@@ -0,0 +1,163 @@
+from collections.abc import Mapping, MutableMapping
+import numpy as np
+
+
+class VolSurface(Mapping):
+    """Columnar implied volatility surface.
+    All quotes of the surface are kept in contiguous float64 arrays, expiry
+    `i` occupies positions `offsets[i]:offsets[i+1]` of every quote array.
+    The object is read-compatible with the dictionary returned by
+    `get_Implied_volatility`: `surface["implied_volatility_surface"]` is a
+    list of per-expiry mappings whose array entries are zero-copy views.
+    Attributes:
+      underlying_ticker, data_date, reference_spot: Snapshot information.
+      expiry_dates: List of expiry dates (strings), one per slice.
+      offsets: Array of length `len(expiry_dates) + 1` with slice boundaries.
+      T, forward, discount_factor: Per-expiry year fractions (ACT/365),
+        reference forwards and discount factors.
+      strike, log_moneyness, bid_iv, mid_iv, ask_iv: Per-quote arrays,
+        `bid_iv` and `ask_iv` are None if bid-ask data is absent.
+    Methods:
+      from_dict: Builds the surface from the dictionary of
+        `get_Implied_volatility`.
+      expiry_view: Returns zero-copy view of one expiry.
+      to_dict: Converts the surface back to the dictionary of lists.
+    """
+    __slots__ = ("underlying_ticker", "data_date", "reference_spot", "expiry_dates", "offsets", "T", "forward", "discount_factor",
+                 "strike", "log_moneyness", "bid_iv", "mid_iv", "ask_iv", "_slices")
+
+    def __init__(self, underlying_ticker, data_date, reference_spot, expiry_dates, offsets, T, forward, discount_factor,
+                 strike, mid_iv, bid_iv=None, ask_iv=None):
+        self.underlying_ticker = underlying_ticker
+        self.data_date = data_date
+        self.reference_spot = reference_spot
+        self.expiry_dates = list(expiry_dates)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.T = np.ascontiguousarray(T, dtype=np.float64)
+        self.forward = np.ascontiguousarray(forward, dtype=np.float64)
+        self.discount_factor = np.ascontiguousarray(discount_factor, dtype=np.float64)
+        self.strike = np.ascontiguousarray(strike, dtype=np.float64)
+        self.log_moneyness = np.log(self.strike / np.repeat(self.forward, np.diff(self.offsets)))
+        self.mid_iv = np.ascontiguousarray(mid_iv, dtype=np.float64)
+        self.bid_iv = None if bid_iv is None else np.ascontiguousarray(bid_iv, dtype=np.float64)
+        self.ask_iv = None if ask_iv is None else np.ascontiguousarray(ask_iv, dtype=np.float64)
+        self._slices = None
+
+    @classmethod
+    def from_dict(cls, Implied_Volatility):
+        """Builds the surface from the dictionary of `get_Implied_volatility`.
+        Args:
+          Implied_Volatility: Dictionary with `implied_volatility_surface`
+            list of per-expiry dictionaries.
+        Returns:
+          Instance of the class.
+        """
+        surface = Implied_Volatility["implied_volatility_surface"]
+        bid_ask = bool(surface) and all("bid_implied_volatilities" in k for k in surface)
+        offsets = np.concatenate(([0], np.cumsum([len(k["strikes"]) for k in surface], dtype=np.int64)))
+
+        def column(key):
+            return np.concatenate([np.asarray(k[key], dtype=np.float64) for k in surface]) if surface else np.empty(0)
+
+        return cls(Implied_Volatility["underlying_ticker"], Implied_Volatility["data_date"], Implied_Volatility["reference_spot"],
+                   [k["expiry_date"] for k in surface], offsets,
+                   [k["expiry_date_in_act365_year_fraction"] for k in surface],
+                   [k["reference_forward"] for k in surface],
+                   [k["reference_discount_factor"] for k in surface],
+                   column("strikes"), column("mid_implied_volatilities"),
+                   column("bid_implied_volatilities") if bid_ask else None,
+                   column("ask_implied_volatilities") if bid_ask else None)
+
+    @property
+    def T_points(self):
+        """Per-quote year fractions (materialized on each call)."""
+        return np.repeat(self.T, np.diff(self.offsets))
+
+    def expiry_view(self, i):
+        """Returns zero-copy view of the expiry with index `i`.
+        Args:
+          i: Index of the expiry.
+        Returns:
+          `VolSurfaceSlice` mapping with the keys of the per-expiry dictionary
+          of `get_Implied_volatility`.
+        """
+        return self["implied_volatility_surface"][i]
+
+    def to_dict(self):
+        """Converts the surface back to the dictionary of lists."""
+        return {"underlying_ticker": self.underlying_ticker, "data_date": self.data_date, "reference_spot": self.reference_spot,
+                "implied_volatility_surface": [{key: (value.tolist() if isinstance(value, np.ndarray) else value) for key, value in k.items()}
+                                               for k in self["implied_volatility_surface"]]}
+
+    def __getitem__(self, key):
+        if key == "implied_volatility_surface":
+            if self._slices is None:
+                self._slices = [VolSurfaceSlice(self, i) for i in range(len(self.expiry_dates))]
+            return self._slices
+        if key in ("underlying_ticker", "data_date", "reference_spot"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("underlying_ticker", "data_date", "reference_spot", "implied_volatility_surface"))
+
+    def __len__(self):
+        return 4
+
+
+class VolSurfaceSlice(MutableMapping):
+    """Dictionary-compatible view of one expiry of `VolSurface`.
+    Quote arrays are zero-copy views into the parent surface, any other keys
+    (e.g. calibrated SVI parameters) are stored in the slice itself.
+    """
+    __slots__ = ("surface", "index", "extra")
+
+    _scalar_keys = ("expiry_date", "number_of_days_from_value_date", "expiry_date_in_act365_year_fraction", "reference_forward",
+                    "reference_discount_factor")
+    _array_keys = {"strikes": "strike", "log_moneyness": "log_moneyness", "mid_implied_volatilities": "mid_iv",
+                   "bid_implied_volatilities": "bid_iv", "ask_implied_volatilities": "ask_iv"}
+
+    def __init__(self, surface, index):
+        self.surface = surface
+        self.index = index
+        self.extra = {}
+
+    def _keys(self):
+        keys = list(self._scalar_keys) + [key for key, attribute in self._array_keys.items() if getattr(self.surface, attribute) is not None]
+        return keys + [key for key in self.extra if key not in keys]
+
+    def __getitem__(self, key):
+        surface, i = self.surface, self.index
+        if key in self.extra:
+            return self.extra[key]
+        if key in self._array_keys and getattr(surface, self._array_keys[key]) is not None:
+            return getattr(surface, self._array_keys[key])[surface.offsets[i]:surface.offsets[i+1]]
+        if key == "expiry_date":
+            return surface.expiry_dates[i]
+        if key == "expiry_date_in_act365_year_fraction":
+            return float(surface.T[i])
+        if key == "number_of_days_from_value_date":
+            return float(surface.T[i]) * 365
+        if key == "reference_forward":
+            return float(surface.forward[i])
+        if key == "reference_discount_factor":
+            return float(surface.discount_factor[i])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._array_keys:
+            self[key][...] = value # writes into the parent surface
+        elif key in self._scalar_keys:
+            raise KeyError(key + " is read-only")
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        del self.extra[key]
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
@@ -0,0 +1,155 @@
+import argparse
+import json
+import platform
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import scipy
+from SVI_calibrator import SVI
+from SVI_curves import get_w_SVI_raw
+
+'''
+Benchmark of SVI calibration engines on synthetic option chains with known raw SVI parameters (runs offline, without DATA directory).
+Every chain: random parameters, number_of_strikes log-moneynesses in [-x_range, x_range], mid implied volatility with relative noise, bid and ask at -/+ half of relative spread.
+For every engine: wall time, number of objective evaluations, number of calls of the inner solver, parameter error, implied volatility error on the quoted range.
+Results (config, environment, every run and summary per engine) are written to a json file.
+Usage: python benchmark_calibration.py --chains 20 --strikes 15 40 --noise 0 0.005 --output benchmark_calibration.json
+'''
+
+# engine name -> keyword arguments of SVI.calibrate (warm_start: start from perturbed true parameters)
+ENGINES = {
+    'dual_annealing': {'method': 'dual_annealing'},
+    'grid': {'method': 'grid'},
+    'dual_annealing_warm_start': {'method': 'dual_annealing', 'warm_start': True},
+    'grid_warm_start': {'method': 'grid', 'warm_start': True},
+}
+
+#-----------------------------------------------
+# random raw SVI parameters with positive minimal total variance for expiry T
+def get_random_SVI_param(rng, T):
+    b = rng.uniform(0.05, 0.3) * T
+    rho = rng.uniform(-0.8, 0.3)
+    m = rng.uniform(-0.1, 0.1)
+    sigma = rng.uniform(0.05, 0.5)
+    min_w = rng.uniform(0.1, 0.6)**2 * T # minimal total variance
+    a = min_w - b * sigma * np.sqrt(1 - rho**2)
+    return SVI(a, b, rho, m, sigma)
+
+#-----------------------------------------------
+'''
+Function generates synthetic slice for given parameters.
+Function returns dictionary with log-moneyness, true, mid, bid and ask implied volatility and total variance.
+'''
+def get_synthetic_chain(rng, set_param_raw, T, number_of_strikes, x_range=0.5, noise=0.0, spread=0.0):
+    x = np.linspace(-x_range, x_range, number_of_strikes)
+    IV = np.sqrt(get_w_SVI_raw(set_param_raw, x) / T)
+    mid_IV = IV * (1 + noise * rng.standard_normal(number_of_strikes))
+    bid_IV, ask_IV = mid_IV * (1 - spread / 2), mid_IV * (1 + spread / 2)
+    return {'x': x, 'T': T, 'IV': IV, 'mid_IV': mid_IV, 'bid_IV': bid_IV, 'ask_IV': ask_IV,
+            'w': mid_IV**2 * T, 'w_bid': bid_IV**2 * T, 'w_ask': ask_IV**2 * T}
+
+#-----------------------------------------------
+# count calls of the inner solver while the block runs (every inner solve goes through _calibrate_adc_batch, batched call counts once)
+@contextmanager
+def counting_inner_solver(counter):
+    calibrate_adc_batch = SVI.__dict__['_calibrate_adc_batch']
+    def counted(cls, *args, **kwargs):
+        counter['inner_solver_calls'] += 1
+        return calibrate_adc_batch.__func__(cls, *args, **kwargs)
+    SVI._calibrate_adc_batch = classmethod(counted)
+    try:
+        yield counter
+    finally:
+        SVI._calibrate_adc_batch = calibrate_adc_batch
+
+#-----------------------------------------------
+'''
+Function calibrates one synthetic slice with given engine.
+Function returns dictionary with timings, counters and recovery errors.
+'''
+def run_engine(engine, chain, true_param, rng, seed=None, use_bid_ask=False, N=200):
+    kwargs = dict(ENGINES[engine])
+    if kwargs.pop('warm_start', False):
+        kwargs['initial_param'] = SVI(true_param.a, true_param.b, true_param.rho, true_param.m + rng.normal(0, 0.02), true_param.sigma * np.exp(rng.normal(0, 0.2)))
+    if use_bid_ask:
+        kwargs.update(w_bid=chain['w_bid'], w_ask=chain['w_ask'])
+    counter = {'inner_solver_calls': 0}
+    with counting_inner_solver(counter):
+        start = time.perf_counter()
+        set_param_raw, res = SVI.calibrate(chain['x'], chain['w'], seed=seed, return_minimize_result=True, **kwargs)
+        wall_time = time.perf_counter() - start
+
+    x_dense = np.linspace(chain['x'][0], chain['x'][-1], N)
+    IV_true = np.sqrt(get_w_SVI_raw(true_param, x_dense) / chain['T'])
+    IV_model = np.sqrt(np.maximum(get_w_SVI_raw(set_param_raw, x_dense), 0) / chain['T'])
+    true_array = np.array([true_param.a, true_param.b, true_param.rho, true_param.m, true_param.sigma])
+    model_array = np.array([set_param_raw.a, set_param_raw.b, set_param_raw.rho, set_param_raw.m, set_param_raw.sigma])
+    return {'engine': engine,
+            'wall_time': wall_time,
+            'objective_evaluations': int(res.nfev),
+            'inner_solver_calls': counter['inner_solver_calls'],
+            'stop_reason': getattr(res, 'stop_reason', None),
+            'objective': float(res.fun),
+            'parameter_error': dict(zip(['a', 'b', 'rho', 'm', 'sigma'], np.abs(model_array - true_array).tolist())),
+            'IV_rmse': float(np.sqrt(np.mean((IV_model - IV_true)**2))),
+            'IV_max_error': float(np.max(np.abs(IV_model - IV_true))),
+            'calibrated_param': dict(zip(['a', 'b', 'rho', 'm', 'sigma'], model_array.tolist())),
+            'true_param': dict(zip(['a', 'b', 'rho', 'm', 'sigma'], true_array.tolist()))}
+
+#-----------------------------------------------
+# median and mean of numerical metrics of runs per engine
+def get_summary(runs):
+    summary = {}
+    for engine in dict.fromkeys(r['engine'] for r in runs):
+        engine_runs = [r for r in runs if r['engine'] == engine]
+        summary[engine] = {'runs': len(engine_runs)}
+        for metric in ['wall_time', 'objective_evaluations', 'inner_solver_calls', 'IV_rmse', 'IV_max_error']:
+            values = np.array([r[metric] for r in engine_runs], dtype=float)
+            summary[engine][metric] = {'median': float(np.median(values)), 'mean': float(np.mean(values)), 'max': float(np.max(values))}
+    return summary
+
+#-----------------------------------------------
+'''
+Function runs every engine on every synthetic chain (chains per combination of number of strikes, noise and spread).
+Function returns dictionary with config, environment, runs and summary.
+'''
+def run_benchmark(engines=tuple(ENGINES), chains=10, strikes=(15, 40), noises=(0.0, 0.005), spreads=(0.02,), seed=0, use_bid_ask=False):
+    rng = np.random.default_rng(seed)
+    runs = []
+    for number_of_strikes in strikes:
+        for noise in noises:
+            for spread in spreads:
+                for chain_number in range(chains):
+                    T = rng.uniform(0.02, 1.0)
+                    true_param = get_random_SVI_param(rng, T)
+                    chain = get_synthetic_chain(rng, true_param, T, number_of_strikes, noise=noise, spread=spread)
+                    for engine in engines:
+                        run = run_engine(engine, chain, true_param, np.random.default_rng([seed, chain_number]), seed=chain_number, use_bid_ask=use_bid_ask)
+                        run.update(number_of_strikes=number_of_strikes, noise=noise, spread=spread, T=T, chain=chain_number)
+                        runs.append(run)
+    return {'config': {'engines': list(engines), 'chains': chains, 'strikes': list(strikes), 'noises': list(noises), 'spreads': list(spreads), 'seed': seed, 'use_bid_ask': use_bid_ask},
+            'environment': {'date': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__, 'machine': platform.machine()},
+            'summary': get_summary(runs),
+            'runs': runs}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of SVI calibration engines on synthetic chains')
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--chains', type=int, default=10, help='number of chains per combination of strikes, noise and spread')
+    parser.add_argument('--strikes', type=int, nargs='+', default=[15, 40])
+    parser.add_argument('--noise', type=float, nargs='+', default=[0.0, 0.005], help='relative noise of mid implied volatility')
+    parser.add_argument('--spread', type=float, nargs='+', default=[0.02], help='relative bid-ask spread of implied volatility')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--use-bid-ask', action='store_true', help='stop calibration when the curve is within bid-ask spread')
+    parser.add_argument('--output', default='benchmark_calibration.json')
+    args = parser.parse_args()
+
+    result = run_benchmark(args.engines, args.chains, args.strikes, args.noise, args.spread, args.seed, args.use_bid_ask)
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    for engine, s in result['summary'].items():
+        print(engine, 'time %.4f s' % s['wall_time']['median'], 'evaluations %d' % s['objective_evaluations']['median'],
+              'inner calls %d' % s['inner_solver_calls']['median'], 'IV rmse %.2e' % s['IV_rmse']['median'])
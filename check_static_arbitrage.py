@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
+from scipy import optimize
 
 #-------------------------------------------------------------------
 '''
@@ -29,46 +30,45 @@ def check_static_arbitrage(value_options, data_dict):
 '''
 Function checks calender arbitrage, based on article "Arbitrage-free SVI volatility surfaces" by
 Jim Gatheral and Antoine Jacquiery. We have to compare value option in term of bid for previous expiration with value option in term of ask for further expiration.
-Function returns expirations, when calendar arbitrage exists.
+For every option type values in term of bid and ask are pivoted to (strike x expiry) matrices with expirations sorted by year fraction,
+value in term of ask of every expiration is compared with running maximum of values in term of bid over all previous expirations.
+Function returns dataframe with violations: strike, option type, expiry pair (near expiration with maximal value in term of bid, far expiration), values and magnitude.
 '''
 
 def check_calendar_arbitrage(value_options):
-    value_option_check = value_options
-    strike = value_option_check['strike'].unique()
-    calendar_arbitrage = pd.DataFrame()
-    for k in strike:
-        Calls = value_option_check.loc[(value_option_check['strike'] == k) & (value_option_check['optionType'] == 'calls')] # take calls for specified strike
-        Puts = value_option_check.loc[(value_option_check['strike'] == k) & (value_option_check['optionType'] == 'puts')] # take puts for specified strike
-        Calls = Calls.sort_values(by='expiry_date')
-        Puts = Puts.sort_values(by='expiry_date')
-             # compare value options between different expiration and find those, which value less than in previous expiration in term of bid ask spread
-        c_0 = 0
-        spread_size_last = 0
-        for i in range(0, len(Calls)):
-            spread_size = (Calls['ask'].iloc[i] - Calls['bid'].iloc[i]) / 2
-            c_1 = Calls['value_option'].iloc[i] + spread_size # find value option in term of ask
-            if c_0 < c_1:
-                c_0 = c_1 - spread_size * 2 #find value option in term of bid
-                spread_size_last = spread_size
-            else:
-                calendar_arbitrage = pd.concat([calendar_arbitrage, Calls.loc[(Calls['value_option'] == c_0 + spread_size_last) | (Calls['value_option'] == c_1 - spread_size)]])
-                c_0 = c_1 - spread_size * 2
-                spread_size_last = spread_size
-
-        spread_size_last = 0
-        p_0 = 0
-        for i in range(0, len(Puts)):
-            spread_size = (Puts['ask'].iloc[i] - Puts['bid'].iloc[i]) / 2
-            p_1 = Puts['value_option'].iloc[i] + spread_size # find value option in term of ask
-            if p_0 < p_1:
-                p_0 = p_1 - spread_size * 2 #find value option in term of bid
-                spread_size_last = spread_size
-            else:
-                calendar_arbitrage = pd.concat([calendar_arbitrage, Puts.loc[(Puts['value_option'] == p_0 + spread_size_last) | (Puts['value_option'] == p_1 - spread_size)]])
-                p_0 = p_1 - spread_size * 2
-                spread_size_last = spread_size
-
-    return calendar_arbitrage
+    columns = ['strike', 'optionType', 'expiry_date_near', 'expiry_date_far', 'value_bid_near', 'value_ask_far', 'magnitude']
+    spread_size = (value_options['ask'] - value_options['bid']) / 2
+    value_option_check = value_options.assign(value_bid=value_options['value_option'] - spread_size, value_ask=value_options['value_option'] + spread_size) # value option in term of bid and ask
+    value_option_check = value_option_check.drop_duplicates(subset=['optionType', 'strike', 'expiry_date'])
+    expiry_dates = value_option_check.groupby('expiry_date')['expiry_date_in_act365_year_fraction'].first().sort_values().index # expirations in time order
+    
+    calendar_arbitrage = []
+    for optionType, options in value_option_check.groupby('optionType'):
+        value_bid = options.pivot(index='strike', columns='expiry_date', values='value_bid').reindex(columns=expiry_dates)
+        value_ask = options.pivot(index='strike', columns='expiry_date', values='value_ask').reindex(columns=expiry_dates)
+        bid = value_bid.to_numpy(dtype=float)
+        ask = value_ask.to_numpy(dtype=float)
+        
+        # running maximum of values in term of bid over previous expirations and its expiration
+        running_max = np.fmax.accumulate(bid, axis=1)
+        running_argmax = np.maximum.accumulate(np.where(bid == running_max, np.arange(bid.shape[1]), -1), axis=1)
+        previous_max = np.full_like(bid, np.nan)
+        previous_max[:, 1:] = running_max[:, :-1]
+        previous_argmax = np.full(bid.shape, -1)
+        previous_argmax[:, 1:] = running_argmax[:, :-1]
+        
+        # compare value options between different expiration and find those, which value less than in previous expirations in term of bid ask spread
+        magnitude = previous_max - ask
+        strike_index, expiry_index = np.nonzero(magnitude > 0)
+        calendar_arbitrage.append(pd.DataFrame({'strike': value_bid.index.to_numpy()[strike_index], 'optionType': optionType,
+                                                'expiry_date_near': expiry_dates.to_numpy()[previous_argmax[strike_index, expiry_index]],
+                                                'expiry_date_far': expiry_dates.to_numpy()[expiry_index],
+                                                'value_bid_near': previous_max[strike_index, expiry_index], 'value_ask_far': ask[strike_index, expiry_index],
+                                                'magnitude': magnitude[strike_index, expiry_index]}, columns=columns))
+
+    if not calendar_arbitrage:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(calendar_arbitrage, ignore_index=True)
 #-------------------------------------------------------------
 '''
 Function checks butterflies arbitrage, based on article "Robust Calibration For SVI Model Arbitrage Free" by Tahar Ferhati.
@@ -103,9 +103,65 @@ def check_limit_price(data_dict):
 #-----------------------------------------------------------------------
 '''
 Function computes g-function from article "Arbitrage-free SVI volatility surfaces" by
-Jim Gatheral and Antoine Jacquiery for given expiration and calibrated parameters.
+Jim Gatheral and Antoine Jacquiery for calibrated parameters of all expirations at once on shared grid of log-moneyness x (closed form, no finite differences).
 g(x) := (1 - xw'(x)/2w(x))^2 - w'(x)^2/4 * (1/w(x) + 1/4) + w''(x)/2
+w'(x) = b*(rho + (x-m)/R), w''(x) = b*sigma^2/R^3, R = sqrt((x-m)^2 + sigma^2)
+Function returns arrays w, g with shape (number of expirations, len(x)).
+'''
 
+def get_g_function_SVI(set_params, x):
+    a, b, rho, m, sigma = (np.array([getattr(p, name) for p in set_params], dtype=float)[:, None] for name in ['a', 'b', 'rho', 'm', 'sigma'])
+    x = np.asarray(x, dtype=float)
+    R = np.sqrt((x - m) ** 2 + sigma ** 2)
+    w = a + b * (rho * (x - m) + R) # total varience
+    w_first = b * (rho + (x - m) / R) # first derivative by log-moneyness
+    w_second = b * sigma ** 2 / R ** 3 # second derivative by log-moneyness
+    g = (1 - x * w_first / 2 / w) ** 2 - w_first ** 2 / 4 * (1 / w + 1 / 4) + w_second / 2
+    return w, g
+
+#-----------------------------------------------------------------------
+'''
+Function checks butterflies arbitrage for all expirations with g-function: density is negative where g < 0.
+Sign changes of g on grid of log-moneyness (log of linspace(left_limit, right_limit, N)) are refined by root bracketing (brentq) where g is finite at both ends of the bracket.
+Function returns dataframe with intervals of log-moneyness, where g < 0: expiry_date, x_left, x_right, min_g (minimum on grid).
+'''
+
+def check_butterflies_arbitrage_with_g_function(data_dict, N=1000, left_limit=0.1, right_limit=3):
+    columns = ['expiry_date', 'x_left', 'x_right', 'min_g']
+    surface = data_dict["implied_volatility_surface"]
+    if len(surface) == 0:
+        return pd.DataFrame(columns=columns)
+    x = np.log(np.linspace(left_limit, right_limit, N)) # log - moneyness
+    set_params = [k['set_param_raw'] for k in surface]
+    g = get_g_function_SVI(set_params, x)[1]
+    negative = g < 0
+    
+    intervals = []
+    for number in np.nonzero(negative.any(axis=1))[0]:
+        g_function = lambda y: get_g_function_SVI([set_params[number]], y)[1][0]
+        # boundaries of runs of negative g
+        change = np.diff(negative[number].astype(int))
+        starts = list(np.nonzero(change == 1)[0])
+        ends = list(np.nonzero(change == -1)[0])
+        if negative[number][0]:
+            starts.insert(0, None)
+        if negative[number][-1]:
+            ends.append(None)
+        # root of g between grid points i and i + 1, grid point default if g is not finite at an end (e.g. w <= 0) or does not change sign
+        def refine(i, default):
+            if np.isfinite(g[number][i]) and np.isfinite(g[number][i + 1]) and g[number][i] * g[number][i + 1] <= 0:
+                return optimize.brentq(g_function, x[i], x[i + 1])
+            return default
+        for start, end in zip(starts, ends):
+            x_left = x[0] if start is None else refine(start, x[start + 1])
+            x_right = x[-1] if end is None else refine(end, x[end])
+            run = slice(0 if start is None else start + 1, N if end is None else end + 1)
+            intervals.append([surface[number]['expiry_date'], x_left, x_right, g[number][run].min()])
+    return pd.DataFrame(intervals, columns=columns)
+
+#-----------------------------------------------------------------------
+'''
+Function computes g-function for given expiration (number of expiration in implied volatility surface) and calibrated parameters.
 Function returns g-function value and plots graph.
 '''
 
@@ -113,26 +169,8 @@ def get_g_function_for_butterfly_arbitrage(data_dict, expiry_date, graph=None, N
     set_param = data_dict['implied_volatility_surface'][expiry_date]['set_param_raw'] # calibrated parameters
     expiry_date = data_dict['implied_volatility_surface'][expiry_date]['expiry_date'] # expiration date
     k = np.log(np.linspace(0.1, right_limit,N)) # log - moneyness
-    w_k = np.linspace(0,0,N) # total varience
-    for ind,i in enumerate(k):
-        w_k[ind] = set_param.a + set_param.b * (set_param.rho * (i - set_param.m) + np.sqrt((i - set_param.m) ** 2 + set_param.sigma ** 2))
-    w_k_first = np.linspace(0,0,len(w_k)) # first derivatives by the strike 
-    w_k_second = np.linspace(0,0,len(w_k))# second derivatives by the strike 
-    g_k = np.linspace(0,0,len(w_k))
-    # compute necessary data
-    for i in range(0, len(w_k) - 2):
-        w_k_first[i+1] = (w_k[i+2] - w_k[i]) / (k[i+2] - k[i])
-        w_k_second[i+1] = (w_k[i+2] - 2 * w_k[i+1] + w_k[i]) / (k[i+2] - k[i]) ** 2
-    w_k_first[0] = (w_k[1] - w_k[0]) / (k[1] - k[0])
-    w_k_second[0] = (w_k[1] - w_k[0]) / (k[1] - k[0])
-    w_k_first[len(w_k)-1] = (w_k[len(w_k)-1] - w_k[len(w_k)-2]) / (k[len(w_k)-1] - k[len(w_k)-2])
-    w_k_second[len(w_k)-1] = (w_k[len(w_k)-1] - w_k[len(w_k)-2]) / (k[len(w_k)-1] - k[len(w_k)-2])
-    
-    # compute g-function
-    for i in range(0, len(w_k)):
-        g_k[i] = (1 - k[i] * w_k_first[i] / 2 / w_k[i]) ** 2 - w_k_first[i] ** 2 / 4 * (1 / w_k[i] + 1 / 4) + w_k_second[i] / 2
-        g_k[0] = g_k[1]
-        g_k[-1] = g_k[-2]
+    w_k, g_k = get_g_function_SVI([set_param], k)
+    w_k, g_k = w_k[0], g_k[0]
     
     if graph:
         fig = plt.figure(figsize=(13, 6))
@@ -142,9 +180,9 @@ def get_g_function_for_butterfly_arbitrage(data_dict, expiry_date, graph=None, N
         ax1.plot(k,w_k)
         ax2.plot(k,g_k)
 
-        ax1.set_title(expiry_date + ' implied volatility from SVI')
-        ax1.set_xlabel(r'log moneyness)')
-        ax1.set_ylabel(r'Implied Volatility')
+        ax1.set_title(expiry_date + ' total varience from SVI')
+        ax1.set_xlabel(r'log moneyness')
+        ax1.set_ylabel(r'Total varience')
         ax1.grid()
         ax2.set_title(expiry_date + ' g-function from SVI')
         ax2.set_xlabel(r'log moneyness')
@@ -153,3 +191,132 @@ def get_g_function_for_butterfly_arbitrage(data_dict, expiry_date, graph=None, N
         plt.show()
     return g_k
 
+#-----------------------------------------------------------------------
+'''
+Function finds log-moneyness points where total varience of two SVI slices are equal, for all pairs of slices at once.
+w1(x) = w2(x) <=> b2*R2 - b1*R1 = u, where u = A + B*x, R_i = sqrt((x - m_i)^2 + sigma_i^2).
+Squaring twice gives quartic equation Q = P^2 - 4*b1^2*u^2*R1^2 = 0, P = b2^2*R2^2 - b1^2*R1^2 - u^2, its roots are eigenvalues of companion matrices (batched).
+Real roots are polished by Newton steps on w1 - w2 and kept only if w1 = w2 holds (squaring adds extraneous roots).
+Function returns list of sorted arrays of crossing points for every pair.
+'''
+
+def get_SVI_calendar_crossings(set_params_near, set_params_far, newton_steps=3):
+    near = [np.array([getattr(p, name) for p in set_params_near], dtype=float) for name in ['a', 'b', 'rho', 'm', 'sigma']]
+    far = [np.array([getattr(p, name) for p in set_params_far], dtype=float) for name in ['a', 'b', 'rho', 'm', 'sigma']]
+    a1, b1, rho1, m1, sigma1 = near
+    a2, b2, rho2, m2, sigma2 = far
+    
+    # polynomial coefficients in increasing order of power, one row per pair
+    R1_square = np.stack([m1 ** 2 + sigma1 ** 2, -2 * m1, np.ones_like(m1)], axis=1)
+    R2_square = np.stack([m2 ** 2 + sigma2 ** 2, -2 * m2, np.ones_like(m2)], axis=1)
+    u = np.stack([a1 - a2 - b1 * rho1 * m1 + b2 * rho2 * m2, b1 * rho1 - b2 * rho2], axis=1)
+    P = (b2 ** 2)[:, None] * R2_square - (b1 ** 2)[:, None] * R1_square - _poly_mul(u, u)
+    Q = _poly_mul(P, P) - 4 * (b1 ** 2)[:, None] * _poly_mul(_poly_mul(u, u), R1_square)
+    
+    # roots of quartic: batched companion matrices where leading coefficient is not negligible, np.roots otherwise
+    scale = np.max(np.abs(Q), axis=1)
+    regular = np.abs(Q[:, 4]) > 1e-12 * scale
+    roots = [np.array([])] * len(Q)
+    if regular.any():
+        monic = Q[regular, :4] / Q[regular, 4:5]
+        companion = np.zeros((len(monic), 4, 4))
+        companion[:, 1:, :3] = np.eye(3)
+        companion[:, :, 3] = -monic
+        for number, eigenvalues in zip(np.nonzero(regular)[0], np.linalg.eigvals(companion)):
+            roots[number] = eigenvalues
+    for number in np.nonzero(~regular & (scale > 0))[0]:
+        coefficients = np.trim_zeros(np.where(np.abs(Q[number]) > 1e-12 * scale[number], Q[number], 0), 'b')
+        roots[number] = np.roots(coefficients[::-1]) if len(coefficients) > 1 else np.array([])
+    
+    crossings = []
+    for number, r in enumerate(roots):
+        r = r[np.abs(r.imag) <= 1e-6 * (1 + np.abs(r.real))].real
+        near_param = [p[number] for p in near]
+        far_param = [p[number] for p in far]
+        for _ in range(newton_steps):
+            d, d_first = _SVI_difference(near_param, far_param, r)
+            r = r - np.where(d_first != 0, d / np.where(d_first != 0, d_first, 1), 0)
+        d, _ = _SVI_difference(near_param, far_param, r)
+        w = np.abs(_SVI_difference(near_param, [0, 0, 0, 0, 1], r)[0])
+        r = np.sort(r[np.abs(d) <= 1e-10 + 1e-7 * w])
+        crossings.append(r[np.diff(r, prepend=-np.inf) > 1e-6 * (1 + np.abs(r))]) # merge multiple roots
+    return crossings
+
+#-----------------------------------------------------------------------
+'''
+Function checks calendar arbitrage between calibrated SVI slices of adjacent expirations (in order of year fraction): arbitrage exists where w_near(x) > w_far(x).
+Crossing points are found exactly (get_SVI_calendar_crossings), sign of w_near - w_far is checked between them.
+If x_limits = (x_min, x_max) is given, only this range of log-moneyness is checked.
+Function returns dataframe with intervals: expiry_date_near, expiry_date_far, x_left, x_right, max_violation (maximum of w_near - w_far, inf if unbounded), x_max_violation.
+'''
+
+def check_calendar_arbitrage_SVI(data_dict, x_limits=None):
+    columns = ['expiry_date_near', 'expiry_date_far', 'x_left', 'x_right', 'max_violation', 'x_max_violation']
+    surface = sorted(data_dict["implied_volatility_surface"], key=lambda k: k['expiry_date_in_act365_year_fraction'])
+    if len(surface) < 2:
+        return pd.DataFrame(columns=columns)
+    x_min, x_max = x_limits if x_limits is not None else (-np.inf, np.inf)
+    set_params = [k['set_param_raw'] for k in surface]
+    crossings = get_SVI_calendar_crossings(set_params[:-1], set_params[1:])
+    
+    intervals = []
+    for number, r in enumerate(crossings):
+        near_param = [getattr(set_params[number], name) for name in ['a', 'b', 'rho', 'm', 'sigma']]
+        far_param = [getattr(set_params[number + 1], name) for name in ['a', 'b', 'rho', 'm', 'sigma']]
+        points = np.concatenate([[x_min], r[(r > x_min) & (r < x_max)], [x_max]])
+        # test point inside every segment between crossings
+        left, right = points[:-1], points[1:]
+        with np.errstate(invalid='ignore'):
+            test = np.where(np.isinf(left) & np.isinf(right), 0., np.where(np.isinf(left), right - 1, np.where(np.isinf(right), left + 1, (left + right) / 2)))
+        violation = _SVI_difference(near_param, far_param, test)[0] > 0
+        for start, end in _get_runs(violation):
+            x_left, x_right = left[start], right[end]
+            max_violation, x_max_violation = _get_max_SVI_difference(near_param, far_param, x_left, x_right)
+            intervals.append([surface[number]['expiry_date'], surface[number + 1]['expiry_date'], x_left, x_right, max_violation, x_max_violation])
+    return pd.DataFrame(intervals, columns=columns)
+
+#-----------------------------------------------------------------------
+# product of polynomials (coefficients in increasing order of power, one row per pair)
+def _poly_mul(p, q):
+    result = np.zeros((p.shape[0], p.shape[1] + q.shape[1] - 1))
+    for i in range(p.shape[1]):
+        result[:, i:i + q.shape[1]] += p[:, i:i + 1] * q
+    return result
+
+# difference of total varience w_near - w_far of two SVI slices (parameters a, b, rho, m, sigma) and its derivative
+def _SVI_difference(near_param, far_param, x):
+    x = np.asarray(x, dtype=float)
+    d, d_first = 0., 0.
+    for sign, (a, b, rho, m, sigma) in ((1, near_param), (-1, far_param)):
+        R = np.sqrt((x - m) ** 2 + sigma ** 2)
+        d = d + sign * (a + b * (rho * (x - m) + R))
+        d_first = d_first + sign * b * (rho + (x - m) / R)
+    return d, d_first
+
+# runs of True values: list of (start, end) indices
+def _get_runs(mask):
+    runs = []
+    for i, value in enumerate(mask):
+        if value and runs and runs[-1][1] == i - 1:
+            runs[-1][1] = i
+        elif value:
+            runs.append([i, i])
+    return runs
+
+# maximum of w_near - w_far on interval (inf if it grows without bound on infinite interval)
+def _get_max_SVI_difference(near_param, far_param, x_left, x_right, grid_size=200):
+    (_, b1, rho1, _, _), (_, b2, rho2, _, _) = near_param, far_param
+    if (np.isinf(x_left) and b1 * (1 - rho1) > b2 * (1 - rho2)) or (np.isinf(x_right) and b1 * (1 + rho1) > b2 * (1 + rho2)):
+        return np.inf, x_left if np.isinf(x_left) and b1 * (1 - rho1) > b2 * (1 - rho2) else x_right
+    # bounded difference: coarse grid on finite part of interval (covering vertices m of both slices, which are grid points as well), refined around the best point
+    (_, _, _, m1, sigma1), (_, _, _, m2, sigma2) = near_param, far_param
+    width = 10 * (1 + sigma1 + sigma2)
+    low = x_left if np.isfinite(x_left) else min(m1, m2, x_right) - width
+    high = x_right if np.isfinite(x_right) else max(m1, m2, low) + width
+    grid = np.unique(np.concatenate([np.linspace(low, high, grid_size), [m for m in (m1, m2) if low < m < high]]))
+    d = _SVI_difference(near_param, far_param, grid)[0]
+    i = int(np.argmax(d))
+    res = optimize.minimize_scalar(lambda y: -_SVI_difference(near_param, far_param, y)[0], bounds=(grid[max(i - 1, 0)], grid[min(i + 1, len(grid) - 1)]), method='bounded')
+    if -res.fun >= d[i]:
+        return -res.fun, res.x
+    return d[i], grid[i]
@@ -0,0 +1,22 @@
+import numpy as np
+from datetime import datetime
+from SVI_calibrator import SSVI
+from SVI_curves import computing_SSVI_IV
+from Vol_surface import VolSurface
+
+
+def test_SSVI_on_vol_surface():
+    true_model = SSVI(rho=-0.4, eta=1.2, gamma=0.4, theta=np.array([0.01, 0.02, 0.04]))
+    T = np.array([0.1, 0.25, 0.5])
+    x = np.linspace(-0.4, 0.4, 15)
+    strike = np.concatenate([100 * np.exp(x)] * len(T))
+    mid_iv = np.concatenate([np.sqrt(true_model.total_variance(x, theta) / t) for theta, t in zip(true_model.theta, T)])
+    surface = VolSurface('ETH', datetime(2023, 9, 1), 100., ['2023-9-29', '2023-11-24', '2024-3-1'], np.arange(4) * len(x), T,
+                         np.full(len(T), 100.), np.ones(len(T)), strike, mid_iv)
+
+    computing_SSVI_IV(surface, extrapolation=False, lazy=True)
+
+    for k in surface['implied_volatility_surface']:
+        assert isinstance(k['SSVI'], SSVI)
+        assert k['calibration_status']['status'] == 'SSVI'
+        assert np.max(np.abs(k['max_relative_error'])) < 1e-3
@@ -0,0 +1,20 @@
+import pandas as pd
+import pytest
+from Snapshot_store import SnapshotStore
+
+pytest.importorskip('pyarrow', exc_type=ImportError) # pyarrow is optional
+
+
+def get_option_chain():
+    return pd.DataFrame({'instrumentName': ['ETH-29SEP23-1800-C', 'ETH-29SEP23-1800-P'], 'expiryDate': ['2023-9-29', '2023-9-29'],
+                         'strike': [1800.0, 1800.0], 'optionType': ['calls', 'puts'], 'last close': [1850.0, 1850.0],
+                         'bid': [90.0, 40.0], 'ask': [95.0, 44.0], 'mid': [92.5, 42.0], 'ticker': ['ETH', 'ETH']})
+
+
+def test_write_with_default_time(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.write(get_option_chain(), 'ETH') # datetime.now() has microseconds
+    data = store.read('ETH', columns=['strike', 'optionType', 'snapshot_time'])
+    assert len(data) == 2
+    assert (data['snapshot_time'].dt.microsecond % 1000 == 0).all()
+    assert len(store.snapshot_times('ETH')) == 1